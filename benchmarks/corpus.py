@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''generate reproducible benchmark corpora
+
+usage: python benchmarks/corpus.py [shape] [size] [edn|json|transit]
+
+each shape builds a value with edn types at one of SIZES, the same shape,
+size and seed always give the same value, the value is written as edn, json
+and transit by write_corpus'''
+from __future__ import print_function
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transit.transit_types import Keyword, Symbol, TaggedValue, List, Vector
+
+from transito import transito, transit_json, edn
+
+SIZES = {
+    'small': 100,
+    'medium': 1000,
+    'large': 10000
+}
+
+SEED = 42
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta",
+        "theta", "iota", "kappa", "lambda", "mu"]
+
+def word(rnd):
+    return rnd.choice(WORDS)
+
+def scalar(rnd):
+    choice = rnd.randint(0, 5)
+    if choice == 0:
+        return rnd.randint(-1000000, 1000000)
+    elif choice == 1:
+        return round(rnd.uniform(-1000, 1000), 3)
+    elif choice == 2:
+        return "%s %d" % (word(rnd), rnd.randint(0, 1000))
+    elif choice == 3:
+        return Keyword(word(rnd))
+    elif choice == 4:
+        return rnd.random() < 0.5
+    else:
+        return None
+
+def wide_maps(rnd, size):
+    '''maps with a hundred keys each'''
+    keys = [Keyword("field-%d" % i) for i in range(100)]
+    return Vector([dict((key, scalar(rnd)) for key in keys)
+        for _ in range(max(size // 100, 1))])
+
+def deep_nesting(rnd, size):
+    '''vectors of maps and lists nested fifty levels deep'''
+    # nested values go last, transit's Reader decodes the first item of an
+    # array twice, which is exponential in the depth of arrays nested there
+    values = []
+    for _ in range(max(size // 50, 1)):
+        value = scalar(rnd)
+        for depth in range(50):
+            if depth % 3 == 0:
+                value = {Keyword("child"): value, Keyword("depth"): depth}
+            elif depth % 3 == 1:
+                value = Vector([scalar(rnd), value])
+            else:
+                value = List([Symbol(word(rnd)), value])
+        values.append(value)
+    return Vector(values)
+
+def long_vectors(rnd, size):
+    '''one long vector of numbers'''
+    return Vector([rnd.randint(0, 1 << 40) if i % 2 else rnd.random()
+        for i in range(size)])
+
+def strings(rnd, size):
+    '''strings of different lengths, some with characters to escape'''
+    values = []
+    for i in range(size):
+        text = " ".join(word(rnd) for _ in range(rnd.randint(1, 30)))
+        if i % 5 == 0:
+            text += ' "quoted" \\ back\tslash\n'
+        values.append(text)
+    return Vector(values)
+
+def keywords(rnd, size):
+    '''maps with repeated namespaced keywords and symbols'''
+    return Vector([{
+        Keyword("entity/id"): i,
+        Keyword("entity/kind"): Keyword("kind-%s" % word(rnd)),
+        Keyword("entity/owner"): Symbol("user/%s" % word(rnd)),
+        Keyword("entity/tags"): set(Keyword(word(rnd)) for _ in range(3))
+        } for i in range(size)])
+
+def tagged(rnd, size):
+    '''tagged values, chars, lists and sets'''
+    values = []
+    for i in range(size):
+        values.append(TaggedValue("inst", "2016-01-%02dT10:00:00.000Z" %
+            (i % 28 + 1)))
+        values.append(TaggedValue("uuid",
+            "%08x-7dec-11d0-a765-00a0c91e6bf6" % i))
+        values.append(TaggedValue("my/point",
+            Vector([rnd.randint(0, 100), rnd.randint(0, 100)])))
+        values.append(edn.Char(rnd.choice("abcdef")))
+        values.append(List([i, set([i % 7])]))
+    return Vector(values)
+
+def repeated(rnd, size):
+    '''records that repeat one of a few nested header maps'''
+    def header(version):
+        return {Keyword("type"): Keyword(WORDS[version]),
+                Keyword("version"): version,
+                Keyword("schema"): Vector([Keyword(name) for name in WORDS]),
+                Keyword("source"): {Keyword("host"): "node-%d" % version,
+                    Keyword("tags"): set([Keyword("a"), Keyword("b")])}}
+
+    return Vector([{Keyword("id"): i, Keyword("header"): header(i % 4),
+        Keyword("value"): scalar(rnd)} for i in range(size)])
+
+SHAPES = {
+    'wide_maps': wide_maps,
+    'deep_nesting': deep_nesting,
+    'long_vectors': long_vectors,
+    'strings': strings,
+    'keywords': keywords,
+    'tagged': tagged,
+    'repeated': repeated
+}
+
+def generate(shape, size, seed=SEED):
+    '''return the value for shape at size, a name in SIZES or a number'''
+    rnd = random.Random(seed)
+    return SHAPES[shape](rnd, SIZES.get(size, size))
+
+def serialize(value):
+    '''return {format: text} for the value, json is missing for values with
+    no json form'''
+    texts = {
+        'edn': edn.dumps(value),
+        'transit': transito.write_transit(value)
+    }
+
+    try:
+        texts['json'] = transito.write_json(transit_json.lossy_value(value))
+    except TypeError:
+        pass
+
+    return texts
+
+def write_corpus(directory, shape, size, seed=SEED):
+    '''write the corpus for shape and size to directory, returns
+    (value, texts, {format: path})'''
+    value = generate(shape, size, seed)
+    texts = serialize(value)
+    paths = {}
+
+    for fmt, text in texts.items():
+        path = os.path.join(directory, "%s-%s.%s" % (shape, size, fmt))
+        with open(path, "w") as handle:
+            handle.write(text)
+        paths[fmt] = path
+
+    return value, texts, paths
+
+def main():
+    shape = sys.argv[1] if len(sys.argv) > 1 else 'wide_maps'
+    size = sys.argv[2] if len(sys.argv) > 2 else 'small'
+    fmt = sys.argv[3] if len(sys.argv) > 3 else 'edn'
+    texts = serialize(generate(shape, SIZES.get(size) or int(size)))
+
+    if fmt not in texts:
+        print("%s has no %s form" % (shape, fmt), file=sys.stderr)
+        return 1
+
+    print(texts[fmt])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
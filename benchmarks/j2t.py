@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''compare writing transit through transit-python's Writer against the native
+encoder
+
+usage: python benchmarks/j2t.py [records]
+
+outputs are checked to be identical before timing'''
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transito import transito, transit_json, edn
+
+def make_corpus(records):
+    items = []
+    for i in range(records):
+        items.append('{:record %d :name "record %d" :kind :kind-%d '
+                ':tags #{:a :b} :path [sym-%d 1.5 nil true] '
+                ':nested ({:key-%d "value" :other \\c})}' %
+                (i, i, i % 50, i % 20, i % 10))
+    return edn.loads("[" + " ".join(items) + "]")
+
+def best_of(fn, runs=5):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return min(times)
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    value = make_corpus(records)
+
+    def writer_path():
+        return transito.write_transit_writer(value)
+
+    def native_path():
+        return transito.write_transit(value)
+
+    output = native_path()
+    if writer_path() != output:
+        print("outputs differ")
+        return 1
+
+    encoder = transit_json.TransitEncoder()
+    encoder.encodes(value)
+    stats = encoder.stats()
+
+    writer_time = best_of(writer_path)
+    native_time = best_of(native_path)
+    print("%d bytes" % len(output))
+    print("cache: %d hits, %d misses (%.1f%%)" % (stats["cache_hits"],
+        stats["cache_misses"], stats["cache_hit_ratio"] * 100))
+    print("writer: %.3f s" % writer_time)
+    print("native: %.3f s (%.1fx)" % (native_time, writer_time / native_time))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''time every conversion between edn, json and transit
+
+usage: python benchmarks/matrix.py [records]
+
+each conversion runs its handler on a corpus file, direct edn <-> json
+conversions are also timed through an intermediate transit document to show
+what skipping it saves'''
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from argparse import Namespace
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transito import transito, edn
+
+ACTIONS = ['e2e', 'e2j', 'e2t', 'j2e', 'j2j', 'j2t', 't2e', 't2j', 't2t']
+
+# (direct action, first step, second step)
+TWO_STEP = [('e2j', 'e2t', 't2j'), ('j2e', 'j2t', 't2e')]
+
+def make_edn(records):
+    items = []
+    for i in range(records):
+        items.append('{:record %d :name "record %d" :kind :kind-%d '
+                ':tags [:a :b] :path [sym-%d 1.5 nil true] '
+                ':nested ({:key-%d "value" :other \\c})}' %
+                (i, i, i % 50, i % 20, i % 10))
+    return "[" + " ".join(items) + "]"
+
+def same_values(action, output, expected):
+    '''compare outputs by value, map keys may come out in another order'''
+    if action[-1] == 'e':
+        return edn.loads(output) == edn.loads(expected)
+    return json.loads(output) == json.loads(expected)
+
+def run(action, path):
+    out = StringIO()
+    transito.HANDLERS[action](Namespace(action=action, path=path), out)
+    return out.getvalue()
+
+def best_of(fn, runs=3):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return min(times)
+
+def write_file(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "w") as handle:
+        handle.write(data.encode("utf-8") if isinstance(data, unicode)
+                else data)
+    return path
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    directory = tempfile.mkdtemp()
+
+    try:
+        paths = {'e': write_file(directory, "corpus.edn", make_edn(records))}
+        paths['t'] = write_file(directory, "corpus.transit",
+                run('e2t', paths['e']))
+        paths['j'] = write_file(directory, "corpus.json",
+                run('t2j', paths['t']))
+
+        times = {}
+        for action in ACTIONS:
+            path = paths[action[0]]
+            times[action] = best_of(lambda: run(action, path))
+            print("%s: %.3f s" % (action, times[action]))
+
+        for action, first, second in TWO_STEP:
+            def two_step():
+                middle = write_file(directory, "middle",
+                        run(first, paths[action[0]]))
+                return run(second, middle)
+
+            if not same_values(action, two_step(),
+                    run(action, paths[action[0]])):
+                print("%s: outputs differ from %s | %s" %
+                        (action, first, second))
+                continue
+
+            two_step_time = best_of(two_step)
+            print("%s | %s: %.3f s, %s is %.1fx faster" % (first, second,
+                two_step_time, action, two_step_time / times[action]))
+    finally:
+        shutil.rmtree(directory)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''compare the memory of parsed edn trees without interning, with
+interned keywords, symbols and chars and with shared subtrees on top
+
+usage: python benchmarks/memory.py [shape] [size]
+
+each run parses the corpus from benchmarks/corpus.py (keywords at large by
+default) in a child process and reports the size of the parsed tree, shared
+objects counted once, how much the peak resident memory grew and how long
+reading and writing the tree back as edn took'''
+from __future__ import print_function
+
+import os
+import sys
+import time
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transito import edn, stats
+
+import corpus
+
+def tree_size(value):
+    '''bytes used by value and everything it refers to, each object once'''
+    seen = set()
+    pending = [value]
+    total = 0
+
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pending.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            pending.append(obj.__dict__)
+
+    return total, len(seen)
+
+MODES = ("plain", "interned", "shared")
+
+def measure(text, mode, results):
+    for table in (edn.intern_keyword, edn.intern_symbol, edn.intern_char):
+        table.limit = edn.INTERN_LIMIT if mode != "plain" else 0
+        table.clear()
+
+    share = mode == "shared"
+    before = stats.peak_rss_kb()
+    start = time.time()
+    value = edn.loads(text, accept_unknown_tags=True, share=share)
+    elapsed = time.time() - start
+    rss_kb = stats.peak_rss_kb() - before
+
+    start = time.time()
+    edn.dumps(value, memo=share)
+    write_elapsed = time.time() - start
+
+    size, objects = tree_size(value)
+    results.put((size, objects, rss_kb, elapsed, write_elapsed))
+
+def run(text, mode):
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=measure,
+            args=(text, mode, results))
+    child.start()
+    result = results.get()
+    child.join()
+    return result
+
+def main():
+    shape = sys.argv[1] if len(sys.argv) > 1 else 'keywords'
+    size = sys.argv[2] if len(sys.argv) > 2 else 'large'
+    text = corpus.serialize(corpus.generate(shape, size))['edn']
+    print("%s/%s: %d bytes of edn" % (shape, size, len(text)))
+
+    results = {}
+    for mode in MODES:
+        size_bytes, objects, rss_kb, elapsed, write_elapsed = \
+                results[mode] = run(text, mode)
+        print("%-9s tree %9d bytes %8d objects, peak rss +%d KB, "
+                "read %.3f s, write %.3f s" % (mode, size_bytes, objects,
+                    rss_kb, elapsed, write_elapsed))
+
+    for mode in MODES[1:]:
+        print("%s tree is %.1fx smaller" % (mode,
+            float(results["plain"][0]) / results[mode][0]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''measure how long a transito invocation takes on a tiny document
+
+usage: python benchmarks/startup.py [runs]
+
+every subcommand is run as a new process, the median wall time is compared
+against TARGET_MS and the script exits with status 1 if any is slower'''
+from __future__ import print_function
+
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# median wall time for a conversion of a tiny document, see README.rst
+TARGET_MS = 100
+
+INPUTS = {
+    't2j': '["~#list",["~:keyword","~$lala",1,1.2,true,null]]',
+    't2e': '["~#list",["~:keyword","~$lala",1,1.2,true,null]]',
+    'j2t': '{"a": [1, 2.5, true, null]}',
+    'e2t': '(:keyword lala 1 1.2 true nil)',
+    'e2e': '(:keyword lala 1 1.2 true nil)',
+    'e2j': '(:keyword lala 1 1.2 true nil)',
+    'j2e': '{"a": [1, 2.5, true, null]}',
+    'j2j': '{"a": [1, 2.5, true, null]}',
+    't2t': '["~#list",["~:keyword","~$lala",1,1.2,true,null]]'
+}
+
+def run_once(action, data):
+    cmd = [sys.executable, '-c', 'import transito; transito.main()',
+            action, '-']
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.time()
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, env=env)
+    proc.communicate(data.encode('utf-8'))
+    elapsed = (time.time() - start) * 1000
+
+    if proc.returncode != 0:
+        raise RuntimeError("transito %s failed" % action)
+
+    return elapsed
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    slow = []
+
+    for action in sorted(INPUTS):
+        times = [run_once(action, INPUTS[action]) for _ in range(runs)]
+        result = median(times)
+        print("%s: median %.1f ms, min %.1f ms" % (action, result, min(times)))
+        if result > TARGET_MS:
+            slow.append(action)
+
+    if slow:
+        print("over the %d ms target: %s" % (TARGET_MS, ", ".join(slow)))
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''time the edn and transit functions and every conversion on the corpora in
+benchmarks/corpus.py
+
+usage: python benchmarks/suite.py [--output results.json]
+                                  [--baseline baseline.json]
+
+results are written as json, with --baseline each result is compared to the
+saved one and the script exits with status 1 if any is more than
+--threshold slower'''
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import functools
+import platform
+import tempfile
+from argparse import Namespace
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transito import transito, transit_json, edn
+
+import corpus
+
+# (name, input format, function taking the input)
+FUNCTIONS = [
+    ('edn.loads', 'edn',
+        lambda text: edn.loads(text, accept_unknown_tags=True)),
+    ('edn.dumps', 'value', edn.dumps),
+    ('read_transit_handle', 'transit',
+        lambda text: transito.read_transit_handle(StringIO(text))),
+    ('write_transit', 'value', transito.write_transit),
+    ('write_json', 'json_value', transito.write_json)
+]
+
+# the text whose size is reported for the inputs that aren't text
+TEXT_FORMATS = {
+    'value': 'edn',
+    'json_value': 'json'
+}
+
+FORMATS = {
+    'e': 'edn',
+    'j': 'json',
+    't': 'transit'
+}
+
+def conversions():
+    return sorted(action for action, _ in transito.CONVERSIONS)
+
+def run_handler(action, path):
+    out = StringIO()
+    transito.HANDLERS[action](Namespace(action=action, path=path), out)
+    return out.getvalue()
+
+def timings(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+
+    times.sort()
+    return {"best": times[0], "median": times[len(times) // 2]}
+
+def bench_corpus(directory, shape, size, repeat, name_filter=None):
+    '''yield (name, result) for every benchmark on one corpus'''
+    value, texts, paths = corpus.write_corpus(directory, shape, size)
+    inputs = dict(texts, value=value)
+    if 'json' in texts:
+        inputs['json_value'] = transit_json.lossy_value(value)
+
+    cases = []
+    for name, fmt, fn in FUNCTIONS:
+        text = texts.get(TEXT_FORMATS.get(fmt, fmt), "")
+        cases.append((name, inputs.get(fmt), len(text),
+            functools.partial(fn, inputs.get(fmt))))
+
+    for action in conversions():
+        fmt = FORMATS[action[0]]
+        cases.append(("handler." + action, paths.get(fmt),
+            len(texts.get(fmt, "")),
+            functools.partial(run_handler, action, paths.get(fmt))))
+
+    for name, data, size_bytes, fn in cases:
+        key = "%s/%s/%s" % (name, shape, size)
+        if name_filter and name_filter not in key:
+            continue
+        elif data is None:
+            yield key, {"skipped": "no input for this corpus"}
+            continue
+
+        try:
+            fn()
+        except Exception as error:
+            yield key, {"skipped": transito.error_message(error)}
+            continue
+
+        result = timings(fn, repeat)
+        result["bytes"] = size_bytes
+        if result["best"] > 0:
+            result["mb_per_s"] = size_bytes / result["best"] / 1024 / 1024
+        yield key, result
+
+def compare(results, baseline, threshold):
+    '''print each result next to its baseline, returns the names of the
+    results that are more than threshold slower'''
+    regressions = []
+    for key in sorted(results):
+        current = results[key]
+        saved = baseline.get(key)
+        if "best" not in current or not saved or "best" not in saved:
+            continue
+
+        change = current["best"] / saved["best"] - 1 if saved["best"] else 0
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = " REGRESSION"
+        print("%-45s %9.2f ms %9.2f ms %+7.1f%%%s" % (key,
+            saved["best"] * 1000, current["best"] * 1000, change * 100, flag))
+
+    return regressions
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(description='transito benchmarks')
+    parser.add_argument('--shapes', default=",".join(sorted(corpus.SHAPES)),
+            help='comma separated corpus shapes')
+    parser.add_argument('--sizes', default='small,medium',
+            help='comma separated corpus sizes (%s)' %
+            ", ".join(sorted(corpus.SIZES)))
+    parser.add_argument('--repeat', type=int, default=5,
+            help='runs per benchmark, the best and median are kept')
+    parser.add_argument('--filter', default=None,
+            help='only run benchmarks with this text in their name')
+    parser.add_argument('--output', default=None,
+            help='write the results as json to this path')
+    parser.add_argument('--baseline', default=None,
+            help='compare the results to a json file written by --output')
+    parser.add_argument('--threshold', type=float, default=0.1,
+            help='slowdown over the baseline reported as a regression')
+    return parser
+
+def main():
+    args = get_arg_parser().parse_args()
+    directory = tempfile.mkdtemp()
+    results = {}
+
+    try:
+        for shape in args.shapes.split(","):
+            for size in args.sizes.split(","):
+                for key, result in bench_corpus(directory, shape, size,
+                        args.repeat, args.filter):
+                    results[key] = result
+                    if "best" in result:
+                        print("%-45s %9.2f ms" % (key, result["best"] * 1000))
+                    else:
+                        print("%-45s skipped: %s" % (key, result["skipped"]))
+    finally:
+        shutil.rmtree(directory)
+
+    document = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(document, handle, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)["results"]
+
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("%d regressions over %.0f%%" % (len(regressions),
+                args.threshold * 100))
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''compare t2j through transit-python's Reader against the lossy decoder
+
+usage: python benchmarks/t2j.py [records]
+
+the corpus only uses values the Reader path can write as json, outputs are
+checked to be identical before timing'''
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transito import transito
+
+def make_corpus(records):
+    items = []
+    for i in range(records):
+        items.append('["~:record-%d","~$symbol-%d",%d,%d.5,true,null,'
+                '["~#list",["^0","~:record-%d","~$other",["~#char","c"]]],'
+                '"string %d","~~escaped",["~#\'","~i%d"]]' %
+                (i % 50, i % 20, i, i, i % 50, i, i))
+    return "[" + ",".join(items) + "]"
+
+def best_of(fn, runs=5):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return min(times)
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    data = make_corpus(records)
+
+    def reader_path():
+        value = transito.read_transit_string(data, transito.JSON_HANDLERS)
+        return transito.write_json(value)
+
+    def lossy_path():
+        return transito.write_json(transito.read_lossy_transit_string(data))
+
+    if reader_path() != lossy_path():
+        print("outputs differ")
+        return 1
+
+    reader_time = best_of(reader_path)
+    lossy_time = best_of(lossy_path)
+    print("%d bytes" % len(data))
+    print("reader: %.3f s" % reader_time)
+    print("lossy:  %.3f s (%.1fx)" % (lossy_time, reader_time / lossy_time))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
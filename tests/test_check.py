@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_check
+----------------------------------
+
+Tests for `transito.check` module.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from argparse import Namespace
+from StringIO import StringIO
+
+from transito import check, edn, transit_json, transito
+
+def error_of(fn, *args):
+    try:
+        fn(*args)
+    except check.CheckError as error:
+        return error.offset, str(error)
+    return None
+
+class TestCheckEdn(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(check.check_edn(""), 0)
+        self.assertEqual(check.check_edn('{:a [1 "x\\n" #{:c}]} (sym nil)'),
+                2)
+        self.assertEqual(check.check_edn("#foo #bar {:a 1} :ns/kw ; x\n"), 2)
+        self.assertEqual(check.check_edn("[1 2]", True), 1)
+
+    def test_errors(self):
+        self.assertEqual(error_of(check.check_edn, "[1 2"),
+                (0, "vector is never closed"))
+        self.assertEqual(error_of(check.check_edn, "[1 {:a 1 :b}]"),
+                (3, "map with a key and no value"))
+        self.assertEqual(error_of(check.check_edn, "(1 2]"),
+                (4, "unexpected ]"))
+        self.assertEqual(error_of(check.check_edn, "[1 #foo]"),
+                (7, "unexpected ]"))
+        self.assertEqual(error_of(check.check_edn, "1 #foo"),
+                (2, "tag without a value"))
+        self.assertEqual(error_of(check.check_edn, "[:a :]"),
+                (5, "unexpected ]"))
+        self.assertEqual(error_of(check.check_edn, "[1] :"),
+                (4, "keyword without a name"))
+        self.assertEqual(error_of(check.check_edn, '["a" "b\\q"]'),
+                (7, "unsupported escape \\q in string"))
+        self.assertEqual(error_of(check.check_edn, "[1] 2", True),
+                (4, "more than one value"))
+        self.assertEqual(error_of(check.check_edn, "  ", True),
+                (2, "no value"))
+
+    def test_mmap(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "w") as handle:
+                handle.write('{:a [1 "x"]} [2')
+            with open(path, "rb") as handle:
+                buf = edn.map_file(handle)
+                self.assertEqual(error_of(check.check_edn, buf),
+                        (13, "vector is never closed"))
+                buf.close()
+        finally:
+            os.remove(path)
+
+class TestCheckTransit(unittest.TestCase):
+
+    def test_json_offset(self):
+        self.assertEqual(error_of(check.check_json, '[1, 2,, 3]'),
+                (6, "Expecting object"))
+        self.assertEqual(error_of(check.check_json, '{"a": 1} x')[0], 9)
+
+    def test_valid(self):
+        value = edn.loads('[{:a #{:b} :cc "~x"} {:a #{:b} :cc 1.5} '
+                '#foo "bar" {[1] 2}]', accept_unknown_tags=True)
+        for verbose in (False, True):
+            check.check_transit(transit_json.dumps(value, verbose))
+        check.check_transit('["^ ","~:aaaa",1,"^0",2]')
+
+    def test_errors(self):
+        self.assertEqual(error_of(check.check_transit,
+            '[["^ ","^0",1]]'),
+            (0, "at [0][1]: cache reference ^0 before it was defined"))
+        self.assertEqual(error_of(check.check_transit,
+            '["~#set",[1],2]'),
+            (0, "tag ~#set needs one value, got 2"))
+        self.assertEqual(error_of(check.check_transit,
+            '{"a":["~#set",1]}'),
+            (0, 'at ["a"][1]: tag set needs an array'))
+        self.assertEqual(error_of(check.check_transit,
+            '["~#cmap",[[1],2,[3]]]'),
+            (0, "at [1]: cmap with a key and no value"))
+        self.assertEqual(error_of(check.check_transit, '["~ix"]'),
+                (0, "at [0]: bad value ~ix"))
+
+    def test_lines(self):
+        lines = ['[1]\n', '\n', '  [1 2\n', '{:a}\n', '"x"\n']
+        self.assertEqual(check.check_lines(lines, "edn"),
+                (4, [(7, "vector is never closed"),
+                    (12, "map with a key and no value")]))
+        self.assertEqual(check.check_lines(lines, "edn", 100, 2),
+                (2, [(107, "vector is never closed")]))
+
+class TestCheckCommand(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def run_check(self, fmt, data, **options):
+        with open(self.path, "w") as handle:
+            handle.write(data)
+
+        out = StringIO()
+        options.setdefault("lines", False)
+        options.setdefault("limit", None)
+        options.setdefault("jobs", 1)
+        args = Namespace(action="check", format=fmt, path=self.path,
+                **options)
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            transito.HANDLERS["check"](args, out)
+            status = 0
+        except SystemExit as error:
+            status = error.code
+        finally:
+            summary = sys.stderr.getvalue()
+            sys.stderr = stderr
+        return status, out.getvalue(), summary
+
+    def test_document(self):
+        self.assertEqual(self.run_check("edn", "{:a 1} [2]"),
+                (0, "", "2 records, 0 errors\n"))
+        self.assertEqual(self.run_check("json", '{"a": [1, }'),
+                (1, "byte 10: Expecting object\n",
+                    "1 records, 1 errors\n"))
+
+    def test_lines(self):
+        data = '["^ ","a",1]\n["^ ","a"]\n["~#set",1]\n'
+        self.assertEqual(self.run_check("transit", data, lines=True),
+                (1, "byte 13: map as array with a key and no value\n"
+                    "byte 24: at [1]: tag set needs an array\n",
+                    "3 records, 2 errors\n"))
+        self.assertEqual(self.run_check("json", data, lines=True),
+                (0, "", "3 records, 0 errors\n"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_edn
+----------------------------------
+
+Tests for `transito.edn` module.
+"""
+
+import os
+import mmap
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from rply.errors import ParsingError, LexingError
+from transit.transit_types import Keyword, Symbol, TaggedValue, List, Vector, \
+        frozendict
+
+from transito import edn
+
+
+class TestLoads(unittest.TestCase):
+
+    def assertSameAsRply(self, code):
+        value = edn.loads(code, accept_unknown_tags=True)
+        expected = edn.loads(code, accept_unknown_tags=True,
+                engine=edn.ENGINE_RPLY)
+        self.assertEqual(value, expected)
+        self.assertEqual(type(value), type(expected))
+
+    def test_scalars(self):
+        for code in ["42", "-5", "1.2", "nil", "true", "false", r"\tab",
+                r"\a", '"a \\"string\\""', "sym", "ns/sym", ":kw", ":ns/kw"]:
+            self.assertSameAsRply(code)
+
+    def test_strings(self):
+        self.assertEqual(edn.loads(r'"a \"b\" \\ \n\t\r\b\f"'),
+                'a "b" \\ \n\t\r\b\f')
+        self.assertEqual(edn.loads(r'"\u0041\u00e9\ud83d\ude00"'),
+                u"A\xe9\U0001f600".encode("utf-8"))
+        self.assertEqual(edn.loads(u'"\\u00e9 \xe9"'), u"\xe9 \xe9")
+        self.assertSameAsRply(r'["\u00e9\\" "plain"]')
+
+        text = 'x\x01\x1f "\\ \xc3\xa9'
+        self.assertEqual(edn.loads(edn.dumps(text)), text)
+
+        for code in [r'"\q"', r'"\u12"', r'"\u12zz"']:
+            self.assertRaises(ParsingError, edn.loads, code)
+
+        # a backslash before the closing quote leaves the string open
+        for code in [r'"a\"', r'["a\" 1]']:
+            for engine in (edn.ENGINE_STACK, edn.ENGINE_RPLY):
+                self.assertRaises(ParsingError, edn.loads, code,
+                        engine=engine)
+
+    def test_floats(self):
+        self.assertEqual(edn.loads("[-1.5 +2.5 1e16 1.5E-3 -2e+3]"),
+                Vector([-1.5, 2.5, 1e16, 0.0015, -2000.0]))
+        self.assertEqual(edn.loads(edn.dumps([-0.5, 1e22])), Vector([-0.5, 1e22]))
+
+    def test_collections(self):
+        for code in ["[]", "()", "{}", "#{}", "[1 [2 (3 #{4})]]",
+                "{:foo 42 bar true \\a 12.3}", "{[1] (2)}",
+                "; comment\n[1, 2 ,3]"]:
+            self.assertSameAsRply(code)
+
+    def test_tagged(self):
+        self.assertSameAsRply("#a #b [1 #c 2]")
+        self.assertEqual(edn.loads("#my.tag [1]", {"my.tag": str}), "vector [1]")
+        self.assertRaises(KeyError, edn.loads, "#my.tag [1]")
+
+    def test_types(self):
+        value = edn.loads("(:a b [\\c])")
+        self.assertEqual(value, List([Keyword("a"), Symbol("b"),
+            Vector([edn.Char("c")])]))
+
+    def test_errors(self):
+        for code in ["", "1 2", "[1", "]", "{1}", "[1)", "#foo", ": 1"]:
+            self.assertRaises(ParsingError, edn.loads, code)
+
+    def test_long_and_deep(self):
+        value = edn.loads("[" + " ".join(["1"] * 100000) + "]")
+        self.assertEqual(len(value.rep), 100000)
+
+        value = edn.loads("[" * 10000 + "]" * 10000)
+        for _ in range(9999):
+            value = value.rep[0]
+        self.assertEqual(value, Vector([]))
+
+
+class TestTokenize(unittest.TestCase):
+
+    CODE = '{:a [1 2.5]} ; comment\n#x/y "s \\" t" \\newline trueish'
+
+    def test_offsets(self):
+        tokens = list(edn.tokenize(self.CODE))
+        self.assertEqual([(name, self.CODE[start:end])
+            for name, start, end in tokens],
+            [(token.gettokentype(), token.getstr())
+                for token in edn.lexer.lex(self.CODE)])
+        self.assertEqual(tokens[:3], [("omap", 0, 1), ("colon", 1, 2),
+            ("symbol", 2, 3)])
+
+    def test_rply_tokens(self):
+        for token, expected in zip(edn.rply_tokens(self.CODE),
+                edn.lexer.lex(self.CODE)):
+            self.assertEqual(token, expected)
+            position = token.getsourcepos()
+            expected = expected.getsourcepos()
+            self.assertEqual((position.idx, position.lineno, position.colno),
+                    (expected.idx, expected.lineno, expected.colno))
+
+    def test_error_position(self):
+        with self.assertRaises(LexingError) as context:
+            list(edn.tokenize("[1\n 2 ~]"))
+        position = context.exception.getsourcepos()
+        self.assertEqual((position.idx, position.lineno, position.colno),
+                (6, 2, 4))
+
+    def test_mmap(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "w") as handle:
+                handle.write(self.CODE)
+            with open(path) as handle:
+                buf = edn.map_file(handle)
+                self.assertIsInstance(buf, mmap.mmap)
+                self.assertEqual(list(edn.tokenize(buf)),
+                        list(edn.tokenize(self.CODE)))
+            with open(path) as handle:
+                self.assertEqual(list(edn.load_iter(handle,
+                    accept_unknown_tags=True)), list(edn.load_chunks(
+                        [self.CODE], accept_unknown_tags=True)))
+        finally:
+            os.remove(path)
+
+        self.assertIsNone(edn.map_file(StringIO(self.CODE)))
+
+
+class TestLoadIter(unittest.TestCase):
+
+    def test_chunk_boundaries(self):
+        forms = ['{:a 1 :b "x y\\" z"}', '[1 2.5 \\space \\newline \\, nil]',
+                '#tag (a/b :c/d)', '"with spaces, commas"', '#{1 2}', '42']
+        text = (forms[0] + " ; comment\n" + forms[1] + " " + forms[2] +
+                "\n" + forms[3] + ",," + forms[4] + "\n" + forms[5])
+        expected = [edn.loads(form, accept_unknown_tags=True)
+                for form in forms]
+
+        for chunk_size in range(1, len(text) + 1):
+            values = edn.load_iter(StringIO(text), accept_unknown_tags=True,
+                    chunk_size=chunk_size)
+            self.assertEqual(list(values), expected)
+
+    def test_error_position(self):
+        def position(fn, *args, **kwargs):
+            with self.assertRaises(LexingError) as context:
+                list(fn(*args, **kwargs))
+            position = context.exception.getsourcepos()
+            return position.idx, position.lineno, position.colno
+
+        for text in ("[1 2 ~]", "[1 2\n 3 4 ; x\n 5 6 ~]"):
+            expected = position(edn.loads, text)
+            for chunk_size in range(1, len(text) + 1):
+                self.assertEqual(position(edn.load_iter, StringIO(text),
+                    chunk_size=chunk_size), expected)
+
+    def test_empty(self):
+        self.assertEqual(list(edn.load_iter(StringIO(" \n"))), [])
+
+    def test_incomplete(self):
+        values = edn.load_iter(StringIO("[1] [2"))
+        self.assertEqual(next(values), Vector([1]))
+        self.assertRaises(ParsingError, next, values)
+
+
+class TestDumps(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(edn.dumps(edn.loads(
+            '(1 true nil [1.2 {:foo 42} "a\\"sd" \\newline #{ns/sym}])')),
+            '(1 true nil [1.2 {:foo 42} "a\\"sd" \\newline #{ns/sym}])')
+        self.assertEqual(edn.dumps(TaggedValue("y.Error", {"a": [1, 2]})),
+            '#y.Error {"a" [1 2]}')
+        self.assertEqual(edn.dumps(x for x in range(3)), "(0 1 2)")
+        self.assertEqual(edn.dumps({}), "{}")
+
+    def test_map_separators(self):
+        value = edn.loads("{:a 1 :b [2 3]}")
+        self.assertTrue(edn.dumps(value) in
+                ("{:a 1, :b [2 3]}", "{:b [2 3], :a 1}"))
+
+    def test_deep(self):
+        value = []
+        for _ in range(10000):
+            value = [value]
+        self.assertEqual(edn.dumps(value), "[" * 10001 + "]" * 10001)
+
+    def test_subclasses_and_to_edn(self):
+        class Name(str):
+            pass
+
+        class Point(object):
+            def to_edn(self):
+                return TaggedValue("point", [1, 2])
+
+        class Unknown(object):
+            pass
+
+        self.assertEqual(edn.dumps([Name("a"), True, 1, Point()]),
+                '["a" true 1 #point [1 2]]')
+        self.assertRaises(ValueError, edn.dumps, Unknown())
+
+    def test_mappings(self):
+        self.assertEqual(edn.dumps(frozendict({Keyword("a"): 1})), "{:a 1}")
+
+    def test_register_writer(self):
+        class Money(object):
+            def __init__(self, cents):
+                self.cents = cents
+
+        class Euros(Money):
+            pass
+
+        edn.register_writer(Money, lambda obj: TaggedValue("money", obj.cents))
+        try:
+            self.assertEqual(edn.dumps([Money(10), Euros(5)]),
+                    "[#money 10 #money 5]")
+        finally:
+            del edn.WRITERS[Money]
+
+    def test_dump_chunks(self):
+        class Out(object):
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, chunk):
+                self.chunks.append(chunk)
+
+        value = Vector(list(range(1000)))
+        out = Out()
+        edn.dump(value, out, buffer_size=100)
+        self.assertTrue(len(out.chunks) > 1)
+        self.assertEqual("".join(out.chunks), edn.dumps(value))
+
+    def test_interning(self):
+        first = edn.loads("[:a/b sym \\x]")
+        second = edn.loads("(:a/b sym \\x \\newline)")
+        for index in range(3):
+            self.assertTrue(first.rep[index] is second.rep[index])
+        self.assertTrue(second.rep[3] is edn.NL)
+        self.assertTrue(edn.loads("\\x") is edn.intern_char("x"))
+
+        table = edn.InternTable(Keyword, limit=2)
+        a = table("a")
+        self.assertTrue(table("a") is a)
+        table("b")
+        table("c")
+        self.assertEqual(sorted(table.instances), ["c"])
+        self.assertFalse(table("a") is a)
+        self.assertEqual(table("a"), a)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
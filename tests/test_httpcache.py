@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_httpcache
+----------------------------------
+
+Tests for `transito.httpcache` module.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from transito import httpcache
+
+
+class TestFreshness(unittest.TestCase):
+
+    def test_cache_control(self):
+        self.assertEqual(httpcache.parse_cache_control(
+            'max-age=60, No-Cache, private="x"'),
+            {"max-age": "60", "no-cache": None, "private": "x"})
+        self.assertEqual(httpcache.parse_cache_control(None), {})
+
+    def test_lifetime(self):
+        self.assertEqual(httpcache.lifetime([("Cache-Control",
+            "max-age=60")]), 60)
+        self.assertEqual(httpcache.lifetime([("Cache-Control",
+            "max-age=60, no-cache")]), 0)
+        self.assertEqual(httpcache.lifetime([
+            ("Date", "Sun, 06 Nov 1994 08:49:37 GMT"),
+            ("Expires", "Sun, 06 Nov 1994 08:50:37 GMT")]), 60)
+        self.assertEqual(httpcache.lifetime([]), 0)
+
+    def test_storable(self):
+        self.assertTrue(httpcache.is_storable(200, [("ETag", '"a"')]))
+        self.assertTrue(httpcache.is_storable(200,
+            [("Cache-Control", "max-age=5")]))
+        self.assertFalse(httpcache.is_storable(200, []))
+        self.assertFalse(httpcache.is_storable(404,
+            [("Cache-Control", "max-age=5")]))
+        self.assertFalse(httpcache.is_storable(200,
+            [("Cache-Control", "no-store"), ("ETag", '"a"')]))
+
+    def test_entry(self):
+        entry = httpcache.CacheEntry(200, [("Cache-Control", "max-age=10"),
+            ("ETag", '"a"'), ("Last-Modified", "then")], "[:a]\n",
+            time.time() - 20)
+        self.assertFalse(entry.is_fresh())
+        self.assertEqual(entry.validators(), {"If-None-Match": '"a"',
+            "If-Modified-Since": "then"})
+
+        entry.revalidated([("cache-control", "max-age=30"),
+            ("Content-Length", "0")])
+        self.assertTrue(entry.is_fresh())
+        self.assertEqual(entry.headers, [("ETag", '"a"'),
+            ("Last-Modified", "then"), ("cache-control", "max-age=30")])
+
+    def test_keys(self):
+        key = httpcache.cache_key("get", "http://a/", "[1]")
+        self.assertEqual(key, httpcache.cache_key("GET", "http://a/", "[1]"))
+        self.assertNotEqual(key, httpcache.cache_key("GET", "http://a/", ""))
+        self.assertNotEqual(key, httpcache.cache_key("POST", "http://a/",
+            "[1]"))
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        cache = httpcache.ResponseCache(self.directory)
+        self.assertEqual(cache.get("a"), None)
+        cache.put("a", httpcache.CacheEntry(200, [("ETag", '"a"')],
+            '{:a "\xc3\xa9"}\n'))
+        entry = cache.get("a")
+        self.assertEqual((entry.status, entry.headers, entry.body),
+                (200, [("ETag", '"a"')], '{:a "\xc3\xa9"}\n'))
+
+    def test_lru_eviction(self):
+        cache = httpcache.ResponseCache(self.directory, 350)
+        for index, key in enumerate("abc"):
+            cache.put(key, httpcache.CacheEntry(200, [], "x" * 50))
+            # mark each entry as used in order
+            used = time.time() - 100 + index
+            os.utime(cache.path(key), (used, used))
+
+        cache.get("a")
+        cache.put("d", httpcache.CacheEntry(200, [], "x" * 50))
+        self.assertEqual(sorted(os.listdir(self.directory)), ["a", "c", "d"])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_httpclient
+----------------------------------
+
+Tests for `transito.httpclient` module.
+"""
+
+import sys
+import threading
+import traceback
+import unittest
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from transito import httpclient
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def read_body(self):
+        if self.headers.getheader("Transfer-Encoding") != "chunked":
+            length = int(self.headers.getheader("Content-Length") or 0)
+            return self.rfile.read(length)
+
+        self.server.chunked += 1
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+            if size == 0:
+                return "".join(chunks)
+
+    def do_POST(self):
+        body = self.read_body()
+        self.server.bodies.append(body)
+        self.server.clients.add(self.client_address)
+        status = 500 if body == "fail" else 200
+        response = '["^ ","~:ok",true]'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/transit+json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_GET(self):
+        self.read_body()
+        self.server.gets.append(self.path)
+        content_type, chunks = RESPONSES[self.path]
+        cache_control = CACHE_CONTROL.get(self.path)
+        if cache_control and \
+                self.headers.getheader("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if cache_control:
+            self.send_header("Cache-Control", cache_control)
+            self.send_header("ETag", '"v1"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write("%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write("0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+# path to the content type and the chunks of the body served for it
+RESPONSES = {
+    "/transit": ("application/transit+json; charset=utf-8",
+        ['["^ ","~:a",[1,', '2]]\n["~#\'","x', ' \\"y\\""]']),
+    "/json": ("application/json", ['{"a": [1, 2]}', ' 3 {"b"', ': null}']),
+    "/edn": ("application/edn", ["{:a [1 2]} #{:b", "} \"\xc3", "\xa9\""]),
+    "/broken": ("application/transit+json", ["[1, 2] [1,", " x]"]),
+    "/text": ("text/plain", ["plain ", "text"]),
+    "/fresh": ("application/transit+json", ['["~:fresh"]']),
+    "/stale": ("application/transit+json", ['["~:stale"]'])
+}
+
+CACHE_CONTROL = {
+    "/fresh": "max-age=60",
+    "/stale": "no-cache"
+}
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(("127.0.0.1", 0), StandInHandler)
+        self.server.bodies = []
+        self.server.clients = set()
+        self.server.chunked = 0
+        self.server.gets = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:%d/" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestLoad(ServerTestCase):
+
+    def test_repeat(self):
+        result = httpclient.run_load("post", self.url, "[1]", {}, repeat=20,
+                concurrency=3)
+        summary = result.summary()
+        self.assertEqual(summary["requests"], 20)
+        self.assertEqual(summary["statuses"], {200: 20})
+        self.assertEqual(self.server.bodies, ["[1]"] * 20)
+        # keep-alive sessions, one connection per worker
+        self.assertTrue(len(self.server.clients) <= 3)
+        self.assertTrue(0 < summary["p50"] <= summary["p99"] <= summary["max"])
+
+        report = httpclient.format_load_report(result)
+        self.assertTrue("Requests: 20" in report)
+        self.assertTrue("Status 200: 20" in report)
+
+    def test_duration_and_errors(self):
+        result = httpclient.run_load("post", self.url, "fail", {},
+                duration=0.2)
+        self.assertTrue(result.requests > 0)
+        self.assertEqual(result.statuses.keys(), [500])
+
+        result = httpclient.run_load("post", "http://127.0.0.1:1/", "", {},
+                repeat=2)
+        self.assertEqual(result.errors, 2)
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual([httpclient.percentile(values, fraction)
+            for fraction in (0.5, 0.9, 0.99, 1)], [50, 90, 99, 100])
+        self.assertEqual(httpclient.percentile([], 0.5), 0.0)
+
+
+class TestStreaming(ServerTestCase):
+
+    def setUp(self):
+        import tempfile
+        ServerTestCase.setUp(self)
+        self.data = tempfile.NamedTemporaryFile(suffix=".edn")
+        self.data.write("{:a 1} [2 3]")
+        self.data.flush()
+
+    def tearDown(self):
+        self.data.close()
+        ServerTestCase.tearDown(self)
+
+    def http(self, method, path, **options):
+        from argparse import Namespace
+        from StringIO import StringIO
+        from transito import transito
+        out = StringIO()
+        args = Namespace(method=method, url=self.url + path.lstrip("/"),
+                conversion="e2t", path=self.data.name, **options)
+        transito.http_req(args, out)
+        return out.getvalue()
+
+    def body(self, path, cache=None):
+        response = self.http("get", path, cache=cache, cache_size=1)
+        return response.split("\n\n", 1)[1]
+
+    def test_chunked_request(self):
+        self.http("post", "/")
+        self.http("post", "/", no_chunked=True)
+        self.assertEqual(self.server.chunked, 1)
+        expected = '["^ ","~:a",1]\n["~#vector",[2,3]]\n'
+        self.assertEqual(self.server.bodies, [expected, expected])
+
+    def test_responses(self):
+        self.assertEqual(self.body("/transit"), '{:a [1 2]}\n"x \\"y\\""\n')
+        self.assertEqual(self.body("/json"), '{"a" [1 2]}\n3\n{"b" nil}\n')
+        self.assertEqual(self.body("/edn"),
+                '{:a [1 2]}\n#{:b}\n"\xc3\xa9"\n')
+        self.assertEqual(self.body("/text"), "plain text")
+        # values before the error are kept, the rest is written as is
+        self.assertEqual(self.body("/broken"), "[1 2]\n[1, x]")
+
+    def test_cache(self):
+        import shutil
+        import tempfile
+        directory = tempfile.mkdtemp()
+        try:
+            for _ in range(3):
+                self.assertEqual(self.body("/fresh", directory),
+                        "[:fresh]\n")
+                self.assertEqual(self.body("/stale", directory),
+                        "[:stale]\n")
+                self.assertEqual(self.body("/text", directory), "plain text")
+        finally:
+            shutil.rmtree(directory)
+
+        # fresh is served from the cache, stale is revalidated every time
+        # and text is not cacheable
+        self.assertEqual(sorted(self.server.gets),
+                ["/fresh"] + ["/stale"] * 3 + ["/text"] * 3)
+
+    def test_json_texts(self):
+        texts = httpclient.json_texts(['[1,"]', '"] {"a":', '"}"}12 ', 'true'])
+        self.assertEqual(list(texts), ['[1,"]"]', '{"a":"}"}', '12', 'true'])
+
+    def test_stream_output(self):
+        def produce(count, out):
+            for i in range(count):
+                out.write(u"\xe9" * 1000)
+
+        chunks = list(httpclient.stream_output(produce, 100))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual("".join(chunks), "\xc3\xa9" * 100000)
+
+        def fail(out):
+            out.write("x")
+            raise ValueError("broken")
+
+        try:
+            list(httpclient.stream_output(fail))
+            self.fail("expected a ValueError")
+        except ValueError:
+            # the traceback reaches into the producer
+            frames = traceback.extract_tb(sys.exc_info()[2])
+            self.assertEqual(frames[-1][2], "fail")
+
+
+class TestBatch(ServerTestCase):
+
+    def test_run_batch(self):
+        requests = [("post", self.url, str(i), {}) for i in range(20)]
+        requests.append(("post", "http://127.0.0.1:1/", "", {}))
+        results = list(httpclient.run_batch(iter(requests), 3))
+        self.assertEqual(sorted(result.index for result in results),
+                range(21))
+        self.assertEqual(sorted(self.server.bodies),
+                sorted(str(i) for i in range(20)))
+        self.assertTrue(len(self.server.clients) <= 3)
+
+        failed = [result for result in results if result.error is not None]
+        self.assertEqual([result.index for result in failed], [20])
+        self.assertEqual(set(result.status for result in results
+            if result.error is None), set([200]))
+
+    def test_http_batch(self):
+        import tempfile
+        from argparse import Namespace
+        from StringIO import StringIO
+        from transito import transito, edn
+        K = edn.Keyword
+        data = ('[{:method :post :url "%s" :body {:a [1 2]}}\n'
+                ' {:method "get" :url "%stransit"}]\n'
+                '{:url "%sfresh" :headers {"x-y" "z"}}' % ((self.url,) * 3))
+
+        with tempfile.NamedTemporaryFile(suffix=".edn") as handle:
+            handle.write(data)
+            handle.flush()
+            out = StringIO()
+            transito.http_batch(Namespace(path=handle.name, concurrency=2),
+                    out)
+
+        records = sorted(edn.load_iter(StringIO(out.getvalue())),
+                key=lambda record: record[K("index")])
+        self.assertEqual([(record[K("status")], record[K("body")])
+            for record in records], [
+                (200, {K("ok"): True}),
+                (200, edn.loads('[{:a [1 2]} "x \\"y\\""]')),
+                (200, edn.loads('[:fresh]'))])
+        self.assertEqual(self.server.bodies,
+                ['["^ ","~:a",["~#vector",[1,2]]]'])
+        self.assertTrue(all(record[K("latency-ms")] > 0
+            for record in records))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_profiling
+----------------------------------
+
+Tests for `transito.profiling` module.
+"""
+
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from transito import profiling, edn, transito
+
+
+class FakeCode(object):
+    def __init__(self, filename, name):
+        self.co_filename = filename
+        self.co_name = name
+
+
+class FakeFrame(object):
+    def __init__(self, filename, name, local_vars):
+        self.f_code = FakeCode(filename, name)
+        self.f_locals = local_vars
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_labels(self):
+        frame = FakeFrame("/x/transito/edn.py", "read_values",
+                {"token_type": "ovec", "keyword": False})
+        self.assertEqual(profiling.frame_label(frame),
+                "edn.read_values[vector]")
+
+        frame = FakeFrame("/x/transito/edn.py", "iterencode",
+                {"item": edn.Char("a")})
+        self.assertEqual(profiling.frame_label(frame), "edn.iterencode[char]")
+
+        frame = FakeFrame("/x/transito/transito.py", "main", {})
+        self.assertEqual(profiling.frame_label(frame), "transito.main")
+
+    def test_collapsed(self):
+        sampler = profiling.StackSampler()
+        sampler.counts = {"a;b": 2, "a": 1}
+        out = StringIO()
+        sampler.write_collapsed(out)
+        self.assertEqual(out.getvalue(), "a 1\na;b 2\n")
+
+    def test_run(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "out.prof")
+            code = "[" + " ".join("{:a [1 2.5 \"x\"]}" for _ in range(2000)) + "]"
+            value = profiling.run(edn.loads, path, code)
+            self.assertEqual(len(value.rep), 2000)
+            self.assertTrue(pstats.Stats(path).total_calls > 0)
+            self.assertTrue(os.path.exists(profiling.collapsed_path(path)))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_every_subcommand(self):
+        parser = transito.get_arg_parser()
+        for argv in (["serve"], ["pipe"], ["check", "edn", "x"], ["e2t", "x"],
+                ["http", "get", "u", "e2t", "x"], ["http-batch", "x"]):
+            args = parser.parse_args(argv[:1] + ["--profile=out.prof"] +
+                    argv[1:])
+            self.assertEqual(args.profile, "out.prof")
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_server
+----------------------------------
+
+Tests for `transito.server` module.
+"""
+
+import os
+import json
+import shutil
+import socket
+import httplib
+import tempfile
+import threading
+import time
+import unittest
+
+from transito import server
+
+
+class UnixConnection(httplib.HTTPConnection):
+
+    def __init__(self, path):
+        httplib.HTTPConnection.__init__(self, "localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = None
+
+    def start(self, **options):
+        self.server = server.make_server(port=0, workers=2,
+                max_request_size=100, **options)
+        self.server.start_workers()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.stop_workers()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.stop()
+
+    def request(self, connection, method, path, body=None):
+        connection.request(method, path, body)
+        resp = connection.getresponse()
+        return resp.status, resp.getheader("Content-Type"), resp.read()
+
+    def test_tcp(self):
+        self.start()
+        connection = httplib.HTTPConnection(*self.server.server_address)
+        self.assertEqual(self.request(connection, "POST", "/e2t", "[1 :a]"),
+                (200, "application/transit+json",
+                    '["~#vector",[1,"~:a"]]\n'))
+        self.assertEqual(self.request(connection, "POST", "/j2e",
+            '{"a": "\xc3\xa9"}'), (200, "application/edn",
+                '{"a" "\xc3\xa9"}\n'))
+        self.assertEqual(self.request(connection, "POST", "/j2t?verbose",
+            '{"a": 1}'), (200, "application/transit+json", '{"a":1}\n'))
+
+        status, _, body = self.request(connection, "POST", "/e2j", "[1")
+        self.assertEqual(status, 400)
+        self.assertEqual(self.request(connection, "POST", "/x2y", "")[0], 404)
+        self.assertEqual(self.request(connection, "GET", "/", "")[0], 404)
+
+        status, _, body = self.request(connection, "GET", "/metrics")
+        metrics = json.loads(body)
+        self.assertEqual(metrics["requests"], 6)
+        self.assertEqual(metrics["conversions"],
+                {"e2t": 1, "j2e": 1, "j2t": 1, "e2j": 1})
+        self.assertEqual(metrics["statuses"], {"200": 3, "400": 1, "404": 2})
+        self.assertTrue(metrics["latency_ms"]["max"] > 0)
+
+        connection = httplib.HTTPConnection(*self.server.server_address)
+        self.assertEqual(self.request(connection, "POST", "/e2e",
+            "[" * 101)[0], 413)
+
+    def test_keep_alive_latency(self):
+        self.start()
+        connection = httplib.HTTPConnection(*self.server.server_address)
+        start = time.time()
+        for _ in range(20):
+            self.assertEqual(self.request(connection, "POST", "/e2e",
+                "[1]")[0], 200)
+        # a response in several small writes waits ~40 ms for delayed acks
+        self.assertTrue(time.time() - start < 0.4)
+        connection.close()
+
+    def raw_request(self, head):
+        connection = socket.create_connection(self.server.server_address)
+        try:
+            connection.sendall(head)
+            resp = httplib.HTTPResponse(connection)
+            resp.begin()
+            return resp.status, resp.read()
+        finally:
+            connection.close()
+
+    def test_invalid_length(self):
+        self.start()
+        for length in ("abc", "-1"):
+            self.assertEqual(self.raw_request("POST /e2e HTTP/1.1\r\n"
+                "Content-Length: %s\r\n\r\n[1]" % length),
+                (400, "invalid Content-Length\n"))
+
+        status, _, body = self.request(
+                httplib.HTTPConnection(*self.server.server_address),
+                "GET", "/metrics")
+        self.assertEqual(json.loads(body)["statuses"], {"400": 2})
+
+    def test_chunked_body(self):
+        self.start()
+        self.assertEqual(self.raw_request("POST /e2e HTTP/1.1\r\n"
+            "Transfer-Encoding: chunked\r\n\r\n"
+            "2;x=y\r\n[1\r\n2\r\n 2\r\n1\r\n]\r\n0\r\n\r\n"),
+            (200, "[1 2]\n"))
+        self.assertEqual(self.raw_request("POST /e2e HTTP/1.1\r\n"
+            "Transfer-Encoding: chunked\r\n\r\n"
+            + "40\r\n%s\r\n" % ("1" * 64) * 2 + "0\r\n\r\n"),
+            (413, "request over 100 bytes\n"))
+        for chunks in ("x\r\n[1]\r\n0\r\n\r\n", "-3\r\n[1]\r\n0\r\n\r\n",
+                "5\r\n[1]\r\n0\r\n\r\n"):
+            self.assertEqual(self.raw_request("POST /e2e HTTP/1.1\r\n"
+                "Transfer-Encoding: chunked\r\n\r\n" + chunks),
+                (400, "invalid chunked body\n"))
+
+    def test_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "transito.sock")
+            self.start(socket_path=path)
+            connection = UnixConnection(path)
+            self.assertEqual(self.request(connection, "POST", "/e2e",
+                "{:a #{1}}"), (200, "application/edn", "{:a #{1}}\n"))
+
+            # a socket left by a previous server is replaced
+            connection.close()
+            self.stop()
+            self.start(socket_path=path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_socket_path_not_a_socket(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            os.close(fd)
+            self.assertRaises(ValueError, server.make_server,
+                    socket_path=path)
+            self.assertTrue(os.path.exists(path))
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
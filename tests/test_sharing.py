@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_sharing
+----------------------------------
+
+Tests for `transito.sharing` module.
+"""
+
+import json
+import unittest
+
+from transit.transit_types import TaggedValue
+
+from transito import sharing, edn, transit_json, transito
+
+REPEATED = ('[{:a [1 2 #{:x}] :name "some name" :tag #foo {:z 1.5}} '
+        '{:a [1 2 #{:x}] :name "some name" :tag #foo {:z 1.5}} '
+        '(1 2) [1 2] (1 2)]')
+
+class TestHashConser(unittest.TestCase):
+
+    def test_share(self):
+        value = edn.loads(REPEATED, accept_unknown_tags=True, share=True)
+        first, second, list1, vector, list2 = value.rep
+        self.assertIs(first, second)
+        self.assertIs(list1, list2)
+        # equal but of different types
+        self.assertIsNot(list1.rep, vector.rep)
+
+        plain = edn.loads(REPEATED, accept_unknown_tags=True)
+        self.assertEqual(value, plain)
+        self.assertIsNot(plain.rep[0], plain.rep[1])
+
+    def test_types_in_key(self):
+        value = edn.loads("[[1] [1.0] [true] [1]]", share=True)
+        self.assertIs(value.rep[0], value.rep[3])
+        self.assertIsNot(value.rep[0], value.rep[1])
+        self.assertIsNot(value.rep[0], value.rep[2])
+
+    def test_tree(self):
+        data = json.loads('[{"a": [1, {"b": null}]}, {"a": [1, {"b": null}]},'
+                ' [1, {"b": null}]]')
+        value = sharing.HashConser().tree(data)
+        self.assertEqual(value, data)
+        self.assertIs(value[0], value[1])
+        self.assertIs(value[0]["a"], value[2])
+
+        transit = transito.read_transit_string(transit_json.dumps(data))
+        value = sharing.HashConser().tree(transit)
+        self.assertEqual(value, transit)
+        self.assertIs(value[0], value[1])
+
+    def test_rply_engine(self):
+        value = edn.loads(REPEATED, accept_unknown_tags=True, share=True,
+                engine=edn.ENGINE_RPLY)
+        self.assertIs(value.rep[0], value.rep[1])
+
+    def test_shared_subtrees(self):
+        inner = [1, 2]
+        value = [inner, {"a": inner}, [3], TaggedValue("foo", inner)]
+        self.assertEqual(sharing.shared_subtrees(value), set([id(inner)]))
+
+class TestMemo(unittest.TestCase):
+
+    def test_edn(self):
+        plain = edn.loads(REPEATED, accept_unknown_tags=True)
+        shared = edn.loads(REPEATED, accept_unknown_tags=True, share=True)
+        self.assertEqual(edn.dumps(shared, memo=True), edn.dumps(plain))
+
+        nested = edn.loads("[" + "[:a [:a]] " * 200 + "]", share=True)
+        self.assertEqual(edn.dumps(nested, memo=True),
+                "[" + " ".join(["[:a [:a]]"] * 200) + "]")
+
+    def test_transit(self):
+        plain = edn.loads(REPEATED, accept_unknown_tags=True)
+        shared = edn.loads(REPEATED, accept_unknown_tags=True, share=True)
+        for verbose in (False, True):
+            for cache in (False, True):
+                self.assertEqual(
+                        transit_json.dumps(shared, verbose, cache, memo=True),
+                        transit_json.dumps(plain, verbose, cache))
+
+    def test_cache_references(self):
+        # the first copy fills the key cache, the second is written with
+        # references only and reused from then on
+        text = "[" + " ".join(["{:long-key #{:other-key}}"] * 4) + "]"
+        shared = edn.loads(text, share=True)
+        encoder = transit_json.TransitEncoder(memo=True)
+        self.assertEqual(encoder.encodes(shared),
+                transit_json.dumps(edn.loads(text)))
+        self.assertEqual(list(encoder.memo.values()),
+                [(encoder.generation, '["^ ","^1",["^2",["^3"]]]')])
+        # another document starts with an empty cache
+        self.assertEqual(encoder.encodes(shared),
+                transit_json.dumps(edn.loads(text)))
+
+if __name__ == '__main__':
+    unittest.main()
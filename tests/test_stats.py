@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_stats
+----------------------------------
+
+Tests for `transito.stats` module.
+"""
+
+import os
+import json
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from transito import stats, transito
+
+
+class TestStats(unittest.TestCase):
+
+    def test_nested_phases(self):
+        run = stats.Stats()
+        with run.phase("parse"):
+            with run.phase("read"):
+                pass
+            with run.phase("read"):
+                pass
+
+        self.assertEqual(run.phases.keys(), ["parse", "read"])
+        self.assertEqual(run.phases["parse"][2], 1)
+        self.assertEqual(run.phases["read"][2], 2)
+
+    def test_counting(self):
+        run = stats.Stats()
+        handle = run.wrap_input(StringIO("a\nbc\n"))
+        self.assertEqual(list(handle), ["a\n", "bc\n"])
+
+        out = StringIO()
+        run.wrap_output(out).write(u"\xe9")
+        run.count(2)
+        self.assertEqual(out.getvalue(), u"\xe9")
+
+        result = run.result("e2e")
+        self.assertEqual((result["bytes_in"], result["bytes_out"],
+            result["records"]), (5, 2, 2))
+
+    def test_json_report(self):
+        run = stats.Stats()
+        list(run.timed([1, 2], "parse"))
+        out = StringIO()
+        run.report(out, "json", "e2t")
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["action"], "e2t")
+        self.assertEqual(result["phases"]["parse"]["calls"], 3)
+
+    def test_lex_phase(self):
+        fd, path = tempfile.mkstemp()
+        transito.run_stats = run = stats.Stats()
+        try:
+            with os.fdopen(fd, "w") as handle:
+                handle.write("[1 :a] {:b 2}")
+            self.assertEqual(len(list(transito.read_values(path))), 2)
+            # one call per token and one for the end
+            self.assertEqual(run.phases["lex"][2], 11)
+
+            transito.read_edn_string("[1 2]")
+            self.assertEqual(run.phases["lex"][2], 16)
+            self.assertEqual(list(run.phases), ["parse", "lex"])
+        finally:
+            transito.run_stats = stats.NULL_STATS
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
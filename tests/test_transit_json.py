@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_transit_json
+----------------------------------
+
+Tests for `transito.transit_json` module.
+"""
+
+import json
+import unittest
+from uuid import UUID
+from decimal import Decimal
+from StringIO import StringIO
+
+from transit.transit_types import Keyword, Symbol, URI
+
+from transito import transito, transit_json, edn
+
+
+class TestLossyDecoder(unittest.TestCase):
+
+    def assertSameAsReader(self, data):
+        value = transito.read_transit_string(data, transito.JSON_HANDLERS)
+        self.assertEqual(json.dumps(transit_json.loads_lossy(data)),
+                transito.write_json(value))
+
+    def test_same_as_reader(self):
+        for data in ['["~#list",["~:keyword","~$lala",1,1.2,true,null,[],'
+                '["hi",["~#char","a"]]]]', '["~#\'","~n12345678901234567890"]',
+                '["~:abcd","^0",["~#list",[1]],["^1",[2]]]',
+                '["~~x","~^y","~`z","~?f","~_","~d1.5","~zINF","abcd","^0"]']:
+            self.assertSameAsReader(data)
+
+    def test_maps(self):
+        self.assertEqual(json.dumps(transit_json.loads_lossy(
+            '[["^ ","~:key1",1,"~$sym",2],["^ ","^0",3],{"^1":4}]')),
+            '[{":key1": 1, "~sym": 2}, {":key1": 3}, {"~sym": 4}]')
+
+    def test_collections(self):
+        self.assertEqual(transit_json.loads_lossy(
+            '[["~#vector",[1]],["~#set",[2]],{"~#list":[3]}]'),
+            [[1], [2], [3]])
+
+    def test_not_serializable(self):
+        for data in ['["~#\'","~f1.5"]', '["~#\'","~m1"]', '["~#foo",[1]]',
+                '["~#list",[1,"~#list"]]']:
+            self.assertRaises(TypeError, transit_json.loads_lossy, data)
+
+
+class TestTransitEncoder(unittest.TestCase):
+
+    VALUES = [None, True, 1, 2 ** 53, 1.5, float("nan"), u"^ ", u"~a\n\"b",
+            Keyword("keyword"), Symbol("symbol"), [1, [u"abcd", u"abcd"]],
+            {u"aaaa": {u"aaaa": 1}, 1: None, 1.5: True, Keyword("k"): 2},
+            {(1, 2): 3}, set([Keyword("abcd")]),
+            [{u"key%d" % i: i} for i in range(2000)]]
+
+    EDN_VALUES = ['(1 [2 \\c] #{:a})', '#foo/bar {:a 1}', '{[1] (2)}',
+            '[#inst "2015" #inst "2016"]']
+
+    def test_same_as_writer(self):
+        values = self.VALUES + [edn.loads(text, accept_unknown_tags=True)
+                for text in self.EDN_VALUES]
+        for value in values:
+            self.assertEqual(transit_json.dumps(value),
+                    transito.write_transit_writer(value))
+            self.assertEqual(transit_json.dumps(value, verbose=True),
+                    transito.write_transit_writer(value, "json_verbose"))
+
+    def test_cache_stats(self):
+        encoder = transit_json.TransitEncoder()
+        out = StringIO()
+        encoder.encode([Keyword("abcd")] * 3, out)
+        encoder.encode({u"abcd": Keyword("abcd")}, out)
+        self.assertEqual(out.getvalue(),
+                '["~:abcd","^0","^0"]["^ ","abcd","~:abcd"]')
+        self.assertEqual(encoder.stats(), {"documents": 2, "cache_hits": 2,
+            "cache_misses": 3, "cache_hit_ratio": 0.4})
+
+    def test_no_cache(self):
+        self.assertEqual(transit_json.dumps([Keyword("abcd")] * 2,
+            cache=False), '["~:abcd","~:abcd"]')
+
+    def test_handled_types(self):
+        values = [UUID("531a379e-31bb-4ce1-8690-158dceb64be6"),
+                {Decimal("1.5"): URI("http://example.com")},
+                transito.read_transit_string('["~m0",["~#point",[1,2]]]')]
+        for value in values:
+            self.assertEqual(transit_json.dumps(value),
+                    transito.write_transit_writer(value))
+            self.assertEqual(transit_json.dumps(value, verbose=True),
+                    transito.write_transit_writer(value, "json_verbose"))
+
+    def test_not_supported(self):
+        self.assertRaises(TypeError, transit_json.dumps, [object()])
+
+
+class TestLossyValue(unittest.TestCase):
+
+    def test_same_as_transit(self):
+        for text in ['{:a [1 #{:b}] "c" (sym \\d) 1 nil}', ':kw',
+                '["~x" 1.5 true {2 {:x/y z}}]']:
+            value = edn.loads(text)
+            self.assertEqual(transit_json.lossy_value(value),
+                    transit_json.loads_lossy(transit_json.dumps(value)))
+
+    def test_not_serializable(self):
+        for text in ['{[1] 2}', '#inst "2010"']:
+            self.assertRaises(TypeError, transit_json.lossy_value,
+                    edn.loads(text, accept_unknown_tags=True))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
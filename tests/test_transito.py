@@ -8,22 +8,233 @@ test_transito
 Tests for `transito` module.
 """
 
+import os
+import tempfile
 import unittest
+from io import BytesIO
+from argparse import Namespace
+from StringIO import StringIO
 
-from transito import transito
+from transito import transito, edn
 
 
 class TestTransito(unittest.TestCase):
 
     def setUp(self):
-        pass
+        self.paths = []
 
     def tearDown(self):
-        pass
+        for path in self.paths:
+            os.remove(path)
+
+    def convert(self, action, data, **options):
+        fd, path = tempfile.mkstemp()
+        self.paths.append(path)
+        with os.fdopen(fd, "w") as handle:
+            handle.write(data)
+
+        out = StringIO()
+        args = Namespace(action=action, path=path, **options)
+        transito.HANDLERS[action](args, out)
+        return out.getvalue()
 
     def test_000_something(self):
         pass
 
+    def test_edn_multiple_values(self):
+        self.assertEqual(self.convert("e2e", "{:a 1} [2]\n:x"),
+                "{:a 1}\n[2]\n:x\n")
+        self.assertEqual(self.convert("e2t", "1 :x"), '["~#\'",1]\n["~#\'","~:x"]\n')
+
+    def test_conversion_matrix(self):
+        edn_data = '{:a [1 "~x" #{:c}]} (sym nil)'
+        transit_data = self.convert("e2t", edn_data)
+        self.assertEqual(self.convert("e2j", edn_data),
+                '{":a": [1, "~x", [":c"]]}\n["~sym", null]\n')
+        self.assertEqual(self.convert("t2j", transit_data.splitlines()[0]),
+                '{":a": [1, "~x", [":c"]]}\n')
+        self.assertEqual(self.convert("t2t", transit_data.splitlines()[0]),
+                transit_data.splitlines()[0] + "\n")
+
+        json_data = '{"a": [1, "~x", {"b": null}]}'
+        self.assertEqual(self.convert("j2e", json_data),
+                '{"a" [1 "~x" {"b" nil}]}\n')
+        self.assertEqual(self.convert("t2e", self.convert("j2t", json_data)),
+                '{"a" [1 "~x" {"b" nil}]}\n')
+        self.assertEqual(self.convert("j2j", json_data),
+                '{"a": [1, "~x", {"b": null}]}\n')
+
+    def test_transit_verbose(self):
+        self.assertEqual(self.convert("j2t", '{"a": [1]}', verbose=True),
+                '{"a":[1]}\n')
+        self.assertEqual(self.convert("e2t", ':x {:a #{1}}', verbose=True),
+                '{"~#\'":"~:x"}\n{"~:a":{"~#set":[1]}}\n')
+
+    def test_share(self):
+        edn_data = '[{:a [1]} {:a [1]}] {:b 2}'
+        for action in ("e2e", "e2t", "e2j"):
+            self.assertEqual(self.convert(action, edn_data, share=True),
+                    self.convert(action, edn_data))
+
+        json_data = '[{"a": [1]}, {"a": [1]}]'
+        transit_data = self.convert("j2t", json_data)
+        for action, data in (("j2t", json_data), ("j2e", json_data),
+                ("t2e", transit_data), ("t2t", transit_data)):
+            self.assertEqual(self.convert(action, data, share=True),
+                    self.convert(action, data))
+
+    def test_edn_response_error_text(self):
+        values = transito.read_edn_chunks(iter(['[1] ', '[2 ', '3) 4']))
+        self.assertEqual(next(values), edn.loads('[1]'))
+        try:
+            next(values)
+            self.fail("expected a ResponseDecodeError")
+        except transito.ResponseDecodeError as error:
+            self.assertEqual(error.text, '[2 3) 4')
+
+        for read, chunks, expected in (
+                (transito.read_edn_chunks, ['{:a 1} {:b', ' 2} (oops] tail'],
+                    '(oops] tail'),
+                (transito.read_json_texts, ['[1] [bad] {"x', '":1}'],
+                    '[bad] {"x'),
+                (transito.read_transit_texts, ['["~#set",[1]] ["~#set",1] 2'],
+                    '["~#set",1] 2')):
+            values = read(iter(chunks))
+            next(values)
+            with self.assertRaises(transito.ResponseDecodeError) as context:
+                list(values)
+            self.assertEqual(context.exception.text, expected)
+
+
+class TestConvertLines(unittest.TestCase):
+
+    def test_records(self):
+        out = StringIO()
+        result = transito.convert_lines(StringIO('{"a": 1}\n\n[1, 2]\n'),
+                "j2t", out)
+        self.assertEqual(result, (2, 0))
+        self.assertEqual(out.getvalue(), '["^ ","a",1]\n[1,2]\n')
+
+    def test_errors_and_limit(self):
+        lines = StringIO("{:a 1}\n(\n[1 2]\n:b\n")
+        out = StringIO()
+        self.assertRaises(Exception, transito.convert_lines, lines, "e2e",
+                out)
+        # the records before the error are written
+        self.assertEqual(out.getvalue(), "{:a 1}\n")
+
+        out = StringIO()
+        lines.seek(0)
+        result = transito.convert_lines(lines, "e2e", out, limit=3,
+                skip_errors=True)
+        self.assertEqual(result, (3, 1))
+        self.assertEqual(out.getvalue(), "{:a 1}\n[1 2]\n")
+
+
+class TestConvert(unittest.TestCase):
+
+    def test_sources(self):
+        import transito as package
+        expected = '["^ ","~:a",["~#vector",[1,2]]]\n'
+        for src in ('{:a [1 2]}', u'{:a [1 2]}', bytearray('{:a [1 2]}'),
+                memoryview('{:a [1 2]}'), StringIO('{:a [1 2]}')):
+            self.assertEqual(package.convert(src, "edn", "transit"), expected)
+
+        self.assertEqual(transito.convert(u'"\xe9"', "e", "e"),
+                '"\xc3\xa9"\n')
+        self.assertRaises(TypeError, transito.convert, 1, "edn", "json")
+        self.assertRaises(ValueError, transito.convert, "1", "edn", "xml")
+
+    def test_out(self):
+        out = StringIO()
+        self.assertEqual(transito.convert('{"a": [1]}', "json", "transit",
+            out, verbose=True), None)
+        self.assertEqual(out.getvalue(), '{"a":[1]}\n')
+
+    def test_utf8_output(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "w") as handle:
+                handle.write('{"a": "caf\xc3\xa9"}')
+            # like a pipe, BytesIO takes no unicode
+            out = BytesIO()
+            transito.HANDLERS["j2e"](Namespace(path=path),
+                    transito.Utf8Output(out))
+            self.assertEqual(out.getvalue(), '{"a" "caf\xc3\xa9"}\n')
+        finally:
+            os.remove(path)
+
+    def test_handlers_dont_leak(self):
+        char = '["~#char","a"]'
+        self.assertEqual(transito.read_transit_string(char,
+            transito.JSON_HANDLERS), "a")
+        self.assertEqual(transito.read_transit_string(char).tag, "char")
+        self.assertTrue(transito.transit_reader(transito.JSON_HANDLERS) is
+                transito.transit_reader(transito.JSON_HANDLERS))
+
+
+class TestPipe(unittest.TestCase):
+
+    def pipe(self, data, **options):
+        out = StringIO()
+        transito.pipe(Namespace(input=StringIO(data), **options), out)
+        return out.getvalue()
+
+    def test_lines(self):
+        self.assertEqual(self.pipe('e2t [1 :a]\n\nj2e {"a": [1]}\n'
+            'e2j [1\nx2y 1\ne2e 1 2\n', framing="lines"),
+            'ok ["~#vector",[1,"~:a"]]\nok {"a" [1]}\n'
+            'error ParsingError: Ran into a $end where it wasn\'t expected\n'
+            'error unknown conversion x2y\nok 1 2\n')
+
+    def test_length(self):
+        self.assertEqual(self.pipe('e2e 8\n{:a\n 1}\nj2t 1\n1e2e x\n',
+            framing="length", verbose=True),
+            'ok 7\n{:a 1}\nok 10\n{"~#\'":1}\nerror 24\n'
+            'bad frame header \'e2e x\'')
+        self.assertEqual(self.pipe('e2e -1\n[1]\ne2e 3\n[2]\n',
+            framing="length"), 'error 25\nbad frame header \'e2e -1\'')
+        self.assertEqual(self.pipe('e2e 3\n[1]e2e 10\n[1]',
+            framing="length"),
+            'ok 4\n[1]\nerror 31\nframe of 10 bytes ended after 3')
+
+
+class TestConvertParallel(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as handle:
+            for i in range(200):
+                handle.write("[%d :a]\n" % i)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_split_ranges(self):
+        ranges = transito.split_ranges(self.path, 7, chunk_size=100)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.path))
+        with open(self.path) as handle:
+            data = handle.read()
+
+        for start, end in ranges:
+            self.assertEqual(data[end - 1], "\n")
+
+    def test_same_output(self):
+        expected = StringIO()
+        with open(self.path) as handle:
+            transito.convert_lines(handle, "e2t", expected)
+
+        out = StringIO()
+        result = transito.convert_parallel(self.path, "e2t", out, 3)
+        self.assertEqual(result, (200, 0))
+        self.assertEqual(out.getvalue(), expected.getvalue())
+
+        out = StringIO()
+        transito.convert_parallel(self.path, "e2t", out, 3, ordered=False)
+        self.assertEqual(sorted(out.getvalue().splitlines()),
+                sorted(expected.getvalue().splitlines()))
+
 
 if __name__ == '__main__':
     import sys
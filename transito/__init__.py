@@ -1,4 +1,5 @@
 from . import transito
+from .transito import convert
 
 def main():
     '''main cli entry point'''
@@ -0,0 +1,367 @@
+'''syntax checks for the check subcommand
+
+edn is only tokenized, a stack of the open collections and tags checks that
+brackets match, maps have a value for each key and tags and keywords are
+followed by what they need, no value is built. json goes through the json
+module's scanner, which is much faster than any scan in python, and its
+values are dropped right away, transit documents are then walked to check
+tags, maps as arrays and cache references the way transit's Reader reads
+them. Errors are CheckErrors with the byte offset they were found at'''
+from __future__ import print_function
+
+import re
+import json
+from collections import OrderedDict
+
+from transit.rolling_cache import MIN_SIZE_CACHEABLE
+
+from .transit_json import LossyDecoder, MARKERS, CACHEABLE_PREFIXES
+
+class CheckError(Exception):
+    '''a syntax error offset bytes from the start of the input, path is
+    where in a transit document it is'''
+
+    def __init__(self, message, offset=0):
+        Exception.__init__(self, message)
+        self.message = message
+        self.offset = offset
+        self.path = []
+
+    def __str__(self):
+        if self.path:
+            return "at %s: %s" % ("".join("[%s]" % json.dumps(step)
+                for step in self.path), self.message)
+        return self.message
+
+SYMBOL_TOKENS = ("symbol", "ns_symbol")
+
+OPEN_NAMES = {
+    "olist": "list",
+    "ovec": "vector",
+    "omap": "map",
+    "oset": "set",
+    "tag": "tag",
+    "ns_tag": "tag"
+}
+
+# the escapes edn.read_string decodes
+STRING_BODY_RE = re.compile(r'(?:[^\\]|\\(?:["\\ntrbf]|u[0-9a-fA-F]{4}))*')
+
+def unexpected(buf, match, token_type):
+    start = match.start(token_type)
+    return CheckError("unexpected %s" % buf[start:min(match.end(),
+        start + 40)], start)
+
+def check_escapes(buf, start, end):
+    '''check the escapes of the string token at start'''
+    pos = STRING_BODY_RE.match(buf, start + 1, end - 1).end()
+    if pos != end - 1:
+        raise CheckError("unsupported escape %s in string" %
+                buf[pos:pos + 2], pos)
+
+def check_edn(buf, single=False):
+    '''check the edn values in buf, a string or an mmap, and return how
+    many there are, with single there must be exactly one
+
+    tokens are matched with the edn lexer's regex but not turned into
+    tuples, the collection or tag being read is kept in locals and the ones
+    around it in a stack of (kind, items, offset)'''
+    from . import edn
+    scalars = edn.SCALARS
+    closes = edn.CLOSES
+    tags = edn.TAGS
+    stack = []
+    top = None
+    items = 0
+    opened = 0
+    keyword = None
+    match = None
+
+    for match in iter(edn.TOKEN_RE.scanner(buf).match, None):
+        token_type = match.lastgroup
+        if top is None and items and single:
+            raise CheckError("more than one value",
+                    match.start(token_type))
+
+        if keyword is not None:
+            if token_type not in SYMBOL_TOKENS:
+                raise unexpected(buf, match, token_type)
+            keyword = None
+        elif token_type in scalars:
+            if token_type == "string":
+                start = match.start(token_type)
+                end = match.end()
+                if buf.find("\\", start, end) != -1:
+                    check_escapes(buf, start, end)
+        elif token_type == "colon":
+            keyword = match
+            continue
+        elif token_type in closes:
+            if top not in closes[token_type]:
+                raise unexpected(buf, match, token_type)
+            elif top == "omap" and items % 2:
+                raise CheckError("map with a key and no value", opened)
+            top, items, opened = stack.pop()
+        else:
+            # a collection or a tag, waiting for its items or value
+            stack.append((top, items, opened))
+            top = token_type
+            items = 0
+            opened = match.start(token_type)
+            continue
+
+        while top in tags:
+            top, items, opened = stack.pop()
+        items += 1
+
+    pos = edn.SKIP_RE.match(buf, match.end() if match else 0).end()
+    if pos < len(buf):
+        raise CheckError("unexpected character %r" % buf[pos:pos + 1], pos)
+    elif keyword is not None:
+        raise CheckError("keyword without a name", keyword.start("colon"))
+    elif top in tags:
+        raise CheckError("tag without a value", opened)
+    elif top is not None:
+        raise CheckError("%s is never closed" % OPEN_NAMES[top], opened)
+    elif single and not items:
+        raise CheckError("no value", len(buf))
+
+    return items
+
+# "line 1 column 5 (char 4)" in the json module's errors
+JSON_POSITION_RE = re.compile(r":? line \d+ column \d+.*\(char (\d+)")
+
+def json_error(text, error):
+    '''CheckError for a ValueError of the json module, the C scanner
+    doesn't say where errors inside arrays are so text is decoded again with
+    the python scanner to find out'''
+    message = str(error)
+    match = JSON_POSITION_RE.search(message)
+    if match is None:
+        from json import decoder, scanner
+        slow = decoder.JSONDecoder()
+        slow.parse_string = decoder.py_scanstring
+        slow.scan_once = scanner.py_make_scanner(slow)
+        try:
+            slow.decode(text)
+        except ValueError as slow_error:
+            message = str(slow_error)
+            match = JSON_POSITION_RE.search(message)
+        except RuntimeError:
+            # nested deeper than the recursion limit
+            pass
+
+    if match is None:
+        return CheckError(message, len(text) - len(text.lstrip()))
+    return CheckError(message[:match.start()], int(match.group(1)))
+
+def check_json(text, object_pairs_hook=None):
+    '''check a json document with the json module's scanner, returns the
+    parsed nodes'''
+    try:
+        return json.loads(text, object_pairs_hook=object_pairs_hook)
+    except ValueError as error:
+        raise json_error(text, error)
+
+# values of scalars written as "~" + tag + value
+SCALAR_RES = {
+    "i": re.compile(r"-?\d+\Z"),
+    "n": re.compile(r"-?\d+\Z"),
+    "d": re.compile(r"-?(\d+\.?\d*([eE][-+]?\d+)?|NaN|Infinity)\Z"),
+    "?": re.compile(r"[tf]\Z"),
+    "_": re.compile(r"\Z"),
+    "z": re.compile(r"(NaN|INF|-INF)\Z")
+}
+
+CONTAINERS = (list, dict, OrderedDict)
+
+# tags whose value has to be an array
+ARRAY_TAGS = ("set", "list", "cmap", "array")
+
+class TransitChecker(LossyDecoder):
+    '''walk the parsed json of a transit document checking its structure,
+    strings go through the same key cache as in LossyDecoder'''
+
+    def string(self, string, as_map_key):
+        '''the string a cache reference stands for, caches the string if
+        it is cacheable and checks scalars'''
+        if string[:1] == "^" and string != "^ ":
+            value = self.key_to_value.get(string)
+            if value is None:
+                raise CheckError("cache reference %s before it was "
+                        "defined" % string)
+            string = value
+        elif len(string) >= MIN_SIZE_CACHEABLE and \
+                (as_map_key or string[:2] in CACHEABLE_PREFIXES):
+            self.encache(string)
+
+        if string[:1] == "~":
+            if len(string) < 2:
+                raise CheckError("~ without a tag")
+            regex = SCALAR_RES.get(string[1])
+            if regex is not None and not regex.match(string, 2):
+                raise CheckError("bad value %s" % string)
+        return string
+
+    def check(self, node, as_map_key=False):
+        if isinstance(node, basestring):
+            if self.string(node, as_map_key)[:2] == "~#":
+                raise CheckError("tag %s without a value" % node)
+        elif isinstance(node, list):
+            self.check_list(node, as_map_key)
+        elif isinstance(node, dict):
+            self.check_dict(node)
+
+    def check_tagged(self, tag, rep):
+        if not tag:
+            raise CheckError("tag without a name")
+        elif tag in ARRAY_TAGS:
+            if not isinstance(rep, list):
+                raise CheckError("tag %s needs an array" % tag)
+            elif tag == "cmap" and len(rep) % 2:
+                raise CheckError("cmap with a key and no value")
+        self.check(rep)
+
+    def check_list(self, node, as_map_key):
+        if not node:
+            return
+
+        head = node[0]
+        if head == "^ ":
+            if len(node) % 2 == 0:
+                raise CheckError("map as array with a key and no value")
+            start = 1
+        elif isinstance(head, basestring):
+            try:
+                head = self.string(head, as_map_key)
+            except CheckError as error:
+                error.path.insert(0, 0)
+                raise
+            if head[:2] == "~#":
+                if len(node) != 2:
+                    raise CheckError("tag %s needs one value, got %d" %
+                            (head, len(node) - 1))
+                try:
+                    self.check_tagged(head[2:], node[1])
+                except CheckError as error:
+                    error.path.insert(0, 1)
+                    raise
+                return
+            start = 1
+        else:
+            start = 0
+
+        map_keys = head == "^ "
+        index = start
+        try:
+            for index in range(start, len(node)):
+                item = node[index]
+                key = as_map_key or map_keys and index % 2 == 1
+                if item.__class__ is unicode:
+                    if item[:1] in MARKERS or \
+                            key and len(item) >= MIN_SIZE_CACHEABLE:
+                        self.check(item, key)
+                elif item.__class__ in CONTAINERS:
+                    self.check(item, key)
+        except CheckError as error:
+            error.path.insert(0, index)
+            raise
+
+    def check_dict(self, node):
+        if len(node) == 1:
+            key, value = next(iter(node.items()))
+            key = self.string(key, True)
+            try:
+                if key[:2] == "~#":
+                    self.check_tagged(key[2:], value)
+                else:
+                    self.check(value)
+            except CheckError as error:
+                error.path.insert(0, key)
+                raise
+            return
+
+        for key, value in node.items():
+            try:
+                if self.string(key, True)[:2] == "~#":
+                    raise CheckError("tag %s as a map key" % key)
+                self.check(value)
+            except CheckError as error:
+                error.path.insert(0, key)
+                raise
+
+def check_transit(text):
+    '''check a transit json document'''
+    # the key cache depends on the order of map keys
+    TransitChecker().check(check_json(text, OrderedDict))
+
+def check_document(buf, fmt):
+    '''check the single document, or for edn the values, in buf and return
+    how many records it has'''
+    if fmt == "edn":
+        return check_edn(buf)
+    elif fmt == "json":
+        check_json(buf)
+    else:
+        check_transit(buf)
+    return 1
+
+LINE_CHECKERS = {
+    "edn": lambda line: check_edn(line, True),
+    "json": check_json,
+    "transit": check_transit
+}
+
+def check_lines(lines, fmt, offset=0, limit=None):
+    '''check each non empty line in lines as one record, offset is where the
+    first line starts in the input
+
+    returns (records, errors), errors is a list of (offset, message)'''
+    check = LINE_CHECKERS[fmt]
+    records = 0
+    errors = []
+
+    for line in lines:
+        if limit is not None and records >= limit:
+            break
+
+        position = offset
+        offset += len(line)
+        record = line.strip()
+        if not record:
+            continue
+
+        records += 1
+        try:
+            check(record)
+        except CheckError as error:
+            position += len(line) - len(line.lstrip())
+            errors.append((position + error.offset, str(error)))
+
+    return records, errors
+
+def check_range(task):
+    '''check the lines in a byte range of a file in a worker process'''
+    from StringIO import StringIO
+    path, start, end, fmt = task
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+
+    return check_lines(StringIO(data), fmt, start)
+
+def check_parallel(path, fmt, jobs, ranges):
+    '''check the lines in the byte ranges of the file at path in a pool of
+    jobs processes, yields (records, errors) for each range in order'''
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for result in pool.imap(check_range,
+                [(path, start, end, fmt) for start, end in ranges]):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -1,7 +1,8 @@
 from __future__ import print_function
 
 import re
-import ast
+import inspect
+import itertools
 import collections
 
 from transit.transit_types import Keyword, Symbol, TaggedValue, List, Vector
@@ -11,6 +12,10 @@ transit_true = transit.transit_types.true
 transit_false = transit.transit_types.false
 
 from rply import ParserGenerator, LexerGenerator
+from rply.errors import LexingError, ParsingError
+from rply.token import SourcePosition, Token
+
+from .sharing import HashConser, shared_subtrees
 
 lg = LexerGenerator()
 
@@ -19,7 +24,7 @@ NS_SYMBOL = SYMBOL_RE + "/" + SYMBOL_RE
 
 lg.add("boolean", r"(true|false)")
 lg.add("nil", r"nil")
-lg.add("float", r"\d+\.\d+")
+lg.add("float", r"[-+]?(\d+\.\d+([eE][-+]?\d+)?|\d+[eE][-+]?\d+)")
 lg.add("number", r"[-+]?\d+")
 lg.add("olist", r"\(")
 lg.add("clist", r"\)")
@@ -48,21 +53,58 @@ lexer = lg.build()
 pg = ParserGenerator(["boolean", "nil", "float", "number", "olist", "clist",
 "omap", "cmap", "ovec", "cvec", "oset", "colon", "char_nl", "char_tab",
 "char_return", "char_space", "char", "symbol", "ns_symbol", "string",
-"tag", "ns_tag"])
+"tag", "ns_tag"], cache_id="transito-edn")
 
 class Char(TaggedValue):
     def __init__(self, rep):
         TaggedValue.__init__(self, 'char', rep)
 
-NL = Char('\n')
-TAB = Char('\t')
-RETURN = Char('\r')
-SPACE = Char(' ')
+# entries kept by each intern table before it starts over
+INTERN_LIMIT = 64 * 1024
+
+class InternTable(object):
+    '''returns one shared instance of factory(text) per text, keywords,
+    symbols and chars are immutable so every occurrence can use the same
+    object, the table is emptied when it holds limit entries like transit's
+    rolling cache and limit 0 disables it'''
+
+    def __init__(self, factory, limit=INTERN_LIMIT):
+        self.factory = factory
+        self.limit = limit
+        self.instances = {}
+
+    def __call__(self, text):
+        instance = self.instances.get(text)
+        if instance is None:
+            instance = self.factory(text)
+            if self.limit:
+                if len(self.instances) >= self.limit:
+                    self.instances.clear()
+                self.instances[text] = instance
+        return instance
+
+    def clear(self):
+        self.instances.clear()
+
+# shared by every loads call in the process
+intern_keyword = InternTable(Keyword)
+intern_symbol = InternTable(Symbol)
+intern_char = InternTable(Char)
+
+NL = intern_char('\n')
+TAB = intern_char('\t')
+RETURN = intern_char('\r')
+SPACE = intern_char(' ')
+
+# single characters are allocated up front like the named ones
+for code in range(0x21, 0x7f):
+    intern_char(chr(code))
 
 class State(object):
-    def __init__(self, tagged, accept_unknown_tags):
+    def __init__(self, tagged, accept_unknown_tags, share=False):
         self.tagged = tagged if tagged is not None else {}
         self.accept_unknown_tags = accept_unknown_tags
+        self.sharer = HashConser() if share else None
 
 @pg.production("main : value")
 def main(state, p):
@@ -150,38 +192,40 @@ def value_char_space(state, p):
 
 @pg.production("value : char")
 def value_char(state, p):
-    return Char(p[0].value[1])
+    return intern_char(p[0].value[1])
 
 @pg.production("value : string")
 def value_string(state, p):
-    return ast.literal_eval(p[0].value)
+    return read_string(p[0].value)
 
 @pg.production("value : ns_symbol")
 def value_symbol_ns(state, p):
-    return Symbol(p[0].value)
+    return intern_symbol(p[0].value)
 
 @pg.production("value : symbol")
 def value_symbol(state, p):
-    return Symbol(p[0].value)
+    return intern_symbol(p[0].value)
 
 @pg.production("value : colon symbol")
 def value_keyword(state, p):
-    return Keyword(p[1].value)
+    return intern_keyword(p[1].value)
 
 @pg.production("value : colon ns_symbol")
 def value_keyword_ns(state, p):
-    return Keyword(p[1].value)
+    return intern_keyword(p[1].value)
 
-def handle_tagged_value(state, p):
-    tag_name = p[0].value[1:]
+def make_tagged_value(state, tag_name, value):
     if tag_name in state.tagged:
         constr = state.tagged[tag_name]
-        return constr(p[1])
+        return constr(value)
     elif state.accept_unknown_tags:
-        return TaggedValue(tag_name, p[1])
+        return TaggedValue(tag_name, value)
     else:
         raise KeyError("No registered constructor for tag '{}'".format(tag_name))
 
+def handle_tagged_value(state, p):
+    return make_tagged_value(state, p[0].value[1:], p[1])
+
 @pg.production("value : tag value")
 def value_tagged(state, p):
     return handle_tagged_value(state, p)
@@ -190,11 +234,387 @@ def value_tagged(state, p):
 def value_tagged_ns(state, p):
     return handle_tagged_value(state, p)
 
-parser = pg.build()
+# building the LALR tables is the slowest part of importing this module,
+# they are only built when the rply engine is used and rply caches them on
+# disk by cache_id
+parser = None
+
+def get_parser():
+    global parser
+    if parser is None:
+        parser = pg.build()
+
+    return parser
+
+# the rply grammar is kept to compare results against the stack engine,
+# pass engine=ENGINE_RPLY to loads to use it
+ENGINE_STACK = "stack"
+ENGINE_RPLY = "rply"
+
+# one regex for the whole lexer, separators and comments are skipped and the
+# token rules are tried in the order the rply lexer tries them, the name of
+# the group that matched is the token type
+SKIP = "(?:%s)*" % "|".join(rule.re.pattern for rule in lexer.ignore_rules)
+SKIP_RE = re.compile(SKIP)
+TOKEN_RE = re.compile(SKIP + "(?:%s)" % "|".join("(?P<%s>%s)" %
+    (rule.name, rule.re.pattern) for rule in lexer.rules))
+
+SEPARATORS = (" ", ",", "\n", "\t")
+
+def closed_string(text):
+    '''true if the last quote in a string token isn't escaped, if it is
+    the string regex backtracked and more input may give a longer match'''
+    body = text[:-1]
+    return (len(body) - len(body.rstrip("\\"))) % 2 == 0
+
+def source_position(buf, pos, offset=0, lineno=1, colno=1):
+    '''rply SourcePosition of pos in buf, which starts at offset in the
+    input, at line lineno and column colno, buf can be an mmap'''
+    line_start = -(colno - 1)
+    newline = buf.find("\n", 0, pos)
+    while newline != -1:
+        lineno += 1
+        line_start = newline + 1
+        newline = buf.find("\n", line_start, pos)
+    return SourcePosition(offset + pos, lineno, pos - line_start + 1)
+
+def tokenize(buf, pos=0, end=None):
+    '''yield (type, start, end) for the tokens in buf, a string or an
+    mmap, the text of a token is buf[start:end] and is only sliced by
+    whoever needs it'''
+    end = len(buf) if end is None else end
+    match_token = TOKEN_RE.match
+    while True:
+        match = match_token(buf, pos, end)
+        if match is None:
+            break
+        name = match.lastgroup
+        pos = match.end()
+        yield name, match.start(name), pos
+
+    pos = SKIP_RE.match(buf, pos, end).end()
+    if pos < end:
+        raise LexingError(None, source_position(buf, pos))
+
+class Window(object):
+    '''the part of a stream tokenize_chunks is lexing, its tokens are
+    offsets in the whole stream and window[start:end] is their text while
+    they are the current token'''
+
+    def __init__(self):
+        self.buf = ""
+        self.base = 0
+
+    def __getitem__(self, span):
+        base = self.base
+        return self.buf[span.start - base:span.stop - base]
+
+def tokenize_chunks(chunks, window):
+    '''yield (type, start, end) for the tokens in an iterable of text
+    chunks, offsets are from the start of the stream
+
+    while more chunks may come only the text up to the last separator in
+    the buffer is lexed, no token other than strings and comments can span
+    a separator and those fail to match until they are complete, so the
+    buffer only holds the token being read'''
+    buf = ""
+    base = 0
+    # line and column buf starts at
+    lineno = 1
+    colno = 1
+    match_token = TOKEN_RE.match
+
+    for chunk in itertools.chain(chunks, (None,)):
+        final = chunk is None
+        if final:
+            end = len(buf)
+        else:
+            buf += chunk
+            end = max([buf.rfind(sep) for sep in SEPARATORS]) + 1
+
+        window.buf = buf
+        window.base = base
+        pos = 0
+        while True:
+            match = match_token(buf, pos, end)
+            if match is None:
+                break
+            name = match.lastgroup
+            if not final and name == "string" and \
+                    not closed_string(match.group(name)):
+                # wait for the rest of the string
+                break
+            pos = match.end()
+            yield name, base + match.start(name), base + pos
+
+        skipped = SKIP_RE.match(buf, pos, end).end()
+        if final and skipped < end:
+            raise LexingError(None,
+                    source_position(buf, skipped, base, lineno, colno))
+
+        # an incomplete string or comment waits for the next chunk
+        newline = buf.rfind("\n", 0, skipped)
+        if newline == -1:
+            colno += skipped
+        else:
+            lineno += buf.count("\n", 0, skipped)
+            colno = skipped - newline
+        base += skipped
+        buf = buf[skipped:]
+
+def rply_tokens(code):
+    '''the tokens of code as the rply Tokens the rply grammar parses'''
+    lineno = 1
+    line_start = 0
+    last = 0
+    for name, start, end in tokenize(code):
+        newlines = code.count("\n", last, start)
+        if newlines:
+            lineno += newlines
+            line_start = code.rfind("\n", last, start) + 1
+        last = start
+        yield Token(name, code[start:end],
+                SourcePosition(start, lineno, start - line_start + 1))
+
+def unexpected(token_type):
+    # same error type the rply parser raises so callers can handle both
+    return ParsingError("Ran into a %s where it wasn't expected" % token_type,
+            None)
+
+OPENS = ("olist", "ovec", "omap", "oset")
+TAGS = ("tag", "ns_tag")
+CLOSES = {
+    "clist": ("olist",),
+    "cvec": ("ovec",),
+    "cmap": ("omap", "oset")
+}
+
+# named functions instead of lambdas so profiles show the construct
+def read_nil(text):
+    return None
 
-def loads(code, tagged=None, accept_unknown_tags=False):
-    state = State(tagged, accept_unknown_tags)
-    return parser.parse(lexer.lex(code), state)
+def read_boolean(text):
+    return text == "true"
+
+def read_char(text):
+    return intern_char(text[1])
+
+STRING_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    'n': '\n',
+    't': '\t',
+    'r': '\r',
+    'b': '\b',
+    'f': '\f'
+}
+
+def read_string(text):
+    '''value of a string token, text is sliced as it is when it has no
+    escapes'''
+    if "\\" not in text:
+        return text[1:-1]
+    return unescape_string(text)
+
+def bad_escape(text, index, length=2):
+    return ParsingError("Unsupported escape %s in string" %
+            text[index:min(index + length, len(text) - 1)], None)
+
+def code_point(text, index):
+    '''the number in the \\uXXXX escape at index'''
+    digits = text[index + 2:index + 6]
+    if len(digits) != 4 or digits.strip("0123456789abcdefABCDEF"):
+        raise bad_escape(text, index, 6)
+    return int(digits, 16)
+
+def unescape_string(text):
+    '''value of a string token with escapes, in one pass over text, \\u
+    escapes are encoded as utf-8 when text is a byte string'''
+    parts = []
+    pos = 1
+    end = len(text) - 1
+    while True:
+        index = text.find("\\", pos, end)
+        if index == -1:
+            parts.append(text[pos:end])
+            break
+
+        parts.append(text[pos:index])
+        if index + 1 >= end:
+            # the lexer takes "a\" as a string whose quote is escaped
+            raise bad_escape(text, index)
+
+        char = text[index + 1]
+        if char == "u":
+            code = code_point(text, index)
+            pos = index + 6
+            if 0xd800 <= code < 0xdc00 and text[pos:pos + 2] == "\\u":
+                # a surrogate pair is one character
+                low = code_point(text, pos)
+                if 0xdc00 <= low < 0xe000:
+                    code = 0x10000 + ((code - 0xd800) << 10) + low - 0xdc00
+                    pos += 6
+            # unichr can't build characters over 0xffff on narrow builds
+            char = ("\\U%08x" % code).decode("unicode-escape")
+            parts.append(char if isinstance(text, unicode)
+                    else char.encode("utf-8"))
+        else:
+            replacement = STRING_ESCAPES.get(char)
+            if replacement is None:
+                raise bad_escape(text, index)
+            parts.append(replacement)
+            pos = index + 2
+
+    return text[:0].join(parts)
+
+SCALARS = {
+    "number": int,
+    "float": float,
+    "nil": read_nil,
+    "boolean": read_boolean,
+    "char_nl": lambda text: NL,
+    "char_tab": lambda text: TAB,
+    "char_return": lambda text: RETURN,
+    "char_space": lambda text: SPACE,
+    "char": read_char,
+    "string": read_string,
+    "symbol": intern_symbol,
+    "ns_symbol": intern_symbol,
+}
+
+def close_collection(kind, items, token_type):
+    if kind == "ovec":
+        return Vector(items)
+    elif kind == "olist":
+        return List(items)
+    elif kind == "oset":
+        return set(items)
+    elif len(items) % 2:
+        raise unexpected(token_type)
+    else:
+        itr = iter(items)
+        return dict(zip(itr, itr))
+
+def read_values(tokens, state, source):
+    '''yield each top level value parsed from an iterable of (type, start,
+    end) tokens, source[start:end] is the text of a token
+
+    collections and pending tags are kept in an explicit stack of
+    (kind, items) or (kind, tag name) frames so nesting depth doesn't use
+    python recursion and each element is appended once, parsing is linear
+    on the token count'''
+    stack = []
+    keyword = False
+    sharer = state.sharer
+
+    for token_type, start, end in tokens:
+        if keyword:
+            if token_type != "symbol" and token_type != "ns_symbol":
+                raise unexpected(token_type)
+            keyword = False
+            value = intern_keyword(source[start:end])
+        elif token_type in SCALARS:
+            value = SCALARS[token_type](source[start:end])
+        elif token_type == "colon":
+            keyword = True
+            continue
+        elif token_type in CLOSES:
+            if not stack or stack[-1][0] not in CLOSES[token_type]:
+                raise unexpected(token_type)
+            kind, items = stack.pop()
+            value = close_collection(kind, items, token_type)
+            if sharer is not None:
+                value = sharer.share(value)
+        elif token_type in OPENS:
+            stack.append((token_type, []))
+            continue
+        else:
+            stack.append((token_type, source[start + 1:end]))
+            continue
+
+        while stack and stack[-1][0] in TAGS:
+            value = make_tagged_value(state, stack.pop()[1], value)
+            if sharer is not None:
+                value = sharer.share(value)
+
+        if stack:
+            stack[-1][1].append(value)
+        else:
+            yield value
+
+    if stack or keyword:
+        raise unexpected("$end")
+
+def parse_tokens(tokens, state, source):
+    '''parse exactly one value from an iterable of (type, start, end)
+    tokens'''
+    tokens = iter(tokens)
+    for value in read_values(tokens, state, source):
+        # read_values stops right after the value, anything left is an error
+        for token in tokens:
+            raise unexpected(token[0])
+
+        return value
+
+    raise unexpected("$end")
+
+def loads(code, tagged=None, accept_unknown_tags=False, engine=ENGINE_STACK,
+        share=False):
+    '''read one edn value from code, with share equal collections and
+    tagged values in it are the same instance, which must not be mutated'''
+    state = State(tagged, accept_unknown_tags, share)
+    if engine == ENGINE_RPLY:
+        value = get_parser().parse(rply_tokens(code), state)
+        return state.sharer.tree(value) if share else value
+    elif engine == ENGINE_STACK:
+        return parse_tokens(tokenize(code), state, code)
+    else:
+        raise ValueError("Unknown parser engine '{}'".format(engine))
+
+CHUNK_SIZE = 64 * 1024
+
+def load_iter(fp, tagged=None, accept_unknown_tags=False,
+        chunk_size=CHUNK_SIZE, share=False):
+    '''yield each top level value in the file like object fp as soon as it
+    was read, regular files are memory mapped and others like pipes read
+    in chunks of chunk_size so memory is bounded by the largest value and
+    not by the size of the file, with share values are shared across the
+    whole file like in loads'''
+    buf = map_file(fp)
+    if buf is not None:
+        return load_buffer(buf, tagged, accept_unknown_tags, share)
+
+    chunks = iter(lambda: fp.read(chunk_size), "")
+    return load_chunks(chunks, tagged, accept_unknown_tags, share)
+
+def load_chunks(chunks, tagged=None, accept_unknown_tags=False, share=False):
+    '''yield each top level value in an iterable of strings as soon as it
+    was read, values may span chunks'''
+    state = State(tagged, accept_unknown_tags, share)
+    window = Window()
+    return read_values(tokenize_chunks(chunks, window), state, window)
+
+def load_buffer(buf, tagged=None, accept_unknown_tags=False, share=False):
+    '''yield each top level value in buf, a string or an mmap, only the
+    text of scalars is copied out of buf'''
+    state = State(tagged, accept_unknown_tags, share)
+    return read_values(tokenize(buf), state, buf)
+
+def map_file(fp):
+    '''read only mmap of the regular file fp is open on, None if it is
+    something else, like a pipe, or empty or not at its start'''
+    import os
+    import stat
+    import mmap
+    try:
+        fileno = fp.fileno()
+        info = os.fstat(fileno)
+        if not stat.S_ISREG(info.st_mode) or info.st_size == 0 or \
+                fp.tell() != 0:
+            return None
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
 
 CHARS = {
     '\t': 'tab',
@@ -217,60 +637,267 @@ ESCAPE_DCT = {
 for i in range(0x20):
     ESCAPE_DCT.setdefault(chr(i), '\\u{0:04x}'.format(i))
 
+def replace_escape(match):
+    return ESCAPE_DCT[match.group(0)]
+
 def encode_basestring(s):
     """Return a edn representation of a Python string"""
-    def replace(match):
-        return ESCAPE_DCT[match.group(0)]
-
-    return '"' + ESCAPE.sub(replace, s) + '"'
-
-def dumps_cmap(items):
-    keyvals = ", ".join([" ".join([dumps(k), dumps(v)]) for k, v in items])
-    return "{%s}" % keyvals
-
-def dumps(obj):
-    if hasattr(obj, "to_edn"):
-        return dumps(obj.to_edn())
-    elif isinstance(obj, TaggedValue):
-        if obj.tag == "cmap":
-            itr = iter(obj.rep)
-            return dumps_cmap(zip(itr, itr))
-        elif obj.tag == "list":
-            return "(%s)" % " ".join([dumps(item) for item in obj.rep])
-        elif obj.tag == "vector":
-            return "[%s]" % " ".join([dumps(item) for item in obj.rep])
-        elif obj.tag == "char":
-            return "\\%s" % CHARS.get(obj.rep, obj.rep)
-        else:
-            return "#{} {}".format(obj.tag, dumps(obj.rep))
-    elif isinstance(obj, (list, tuple)):
-        return "[%s]" % " ".join([dumps(item) for item in obj])
-    elif isinstance(obj, dict):
-        return dumps_cmap(obj.items())
-    elif isinstance(obj, Keyword):
-        return ":" + str(obj)
-    elif isinstance(obj, Symbol):
-        return str(obj)
-    elif obj is True or obj is transit_true:
-        return "true"
-    elif obj is False or obj is transit_false:
-        return "false"
-    elif obj is None:
-        return "nil"
-    elif isinstance(obj, basestring):
-        return encode_basestring(obj)
-    elif isinstance(obj, set):
-        return "#{%s}" % " ".join([dumps(item) for item in obj])
-    elif isinstance(obj, (int, float)):
-        return str(obj)
-    elif isinstance(obj, collections.Iterable):
-        return "(%s)" % " ".join([dumps(item) for item in obj])
+    if ESCAPE.search(s) is None:
+        return '"' + s + '"'
+    return '"' + ESCAPE.sub(replace_escape, s) + '"'
+
+# writers return the edn text for a value or, for values that contain
+# other values, a (start, items, end, pairs) tuple, pairs is true if items
+# alternate between keys and values
+
+def write_to_edn(obj):
+    return ("", (obj.to_edn(),), "", False)
+
+def write_tagged(obj):
+    if obj.tag == "cmap":
+        return write_cmap(obj)
+    elif obj.tag == "list":
+        return write_list(obj)
+    elif obj.tag == "vector":
+        return write_vector(obj)
+    elif obj.tag == "char":
+        return write_char(obj)
+    else:
+        return ("#%s " % obj.tag, (obj.rep,), "", False)
+
+def write_cmap(obj):
+    return ("{", obj.rep, "}", True)
+
+def write_list(obj):
+    return ("(", obj.rep, ")", False)
+
+def write_vector(obj):
+    return ("[", obj.rep, "]", False)
+
+def write_char(obj):
+    return "\\%s" % CHARS.get(obj.rep, obj.rep)
+
+def write_sequence(obj):
+    return ("[", obj, "]", False)
+
+def write_dict(obj):
+    return ("{", itertools.chain.from_iterable(obj.items()), "}", True)
+
+def write_set(obj):
+    return ("#{", obj, "}", False)
+
+def write_iterable(obj):
+    return ("(", obj, ")", False)
+
+def write_keyword(obj):
+    return ":" + obj.str
+
+def write_symbol(obj):
+    return obj.str
+
+def write_boolean(obj):
+    return "true" if obj else "false"
+
+def write_nil(obj):
+    return "nil"
+
+def write_unknown(obj):
+    raise ValueError("Unknown value {} of type {}".format(obj, type(obj)))
+
+WRITERS = {
+    str: encode_basestring,
+    unicode: encode_basestring,
+    basestring: encode_basestring,
+    int: str,
+    float: str,
+    bool: write_boolean,
+    type(None): write_nil,
+    list: write_sequence,
+    tuple: write_sequence,
+    dict: write_dict,
+    set: write_set,
+    Keyword: write_keyword,
+    Symbol: write_symbol,
+    Vector: write_vector,
+    List: write_list,
+    transit.transit_types.CMap: write_cmap,
+    Char: write_char,
+    TaggedValue: write_tagged,
+    transit.transit_types.Boolean: write_boolean
+}
+
+# writers by exact type, types not in WRITERS are added the first time one
+# of their instances is written
+writer_cache = dict(WRITERS)
+
+def resolve_writer(cls):
+    '''find and cache the writer for a type that isn't in writer_cache,
+    to_edn is looked up on the class, not on each instance'''
+    if hasattr(cls, "to_edn"):
+        writer = write_to_edn
     else:
-        raise ValueError("Unknown value {} of type {}".format(obj, type(obj)))
+        for base in inspect.getmro(cls):
+            if base in WRITERS:
+                writer = WRITERS[base]
+                break
+        else:
+            if issubclass(cls, collections.Mapping):
+                # transit's frozendict isn't a dict
+                writer = write_dict
+            elif issubclass(cls, collections.Iterable):
+                writer = write_iterable
+            else:
+                writer = write_unknown
+
+    writer_cache[cls] = writer
+    return writer
+
+def register_writer(type_, fn):
+    '''write instances of type_ and its subclasses as the value returned by
+    fn(instance), like a to_edn method but without checking for it on every
+    value'''
+    WRITERS[type_] = lambda obj: ("", (fn(obj),), "", False)
+    writer_cache.clear()
+    writer_cache.update(WRITERS)
+
+def encode_value(obj):
+    '''return the edn text for obj or a (start, items, end, pairs) tuple'''
+    writer = writer_cache.get(obj.__class__)
+    if writer is None:
+        writer = resolve_writer(obj.__class__)
+
+    return writer(obj)
+
+DONE = object()
+
+def iterencode(obj):
+    '''yield the edn text for obj in pieces, nested values are walked with
+    an explicit stack of [items, end, pairs, count] frames so deep nesting
+    doesn't hit the recursion limit'''
+    stack = []
+    cache = writer_cache
+    encoded = encode_value(obj)
+
+    while True:
+        if encoded.__class__ is tuple:
+            start, items, end, pairs = encoded
+            if start:
+                yield start
+            stack.append([iter(items), end, pairs, 0])
+        else:
+            yield encoded
+
+        while stack:
+            frame = stack[-1]
+            item = next(frame[0], DONE)
+            if item is DONE:
+                stack.pop()
+                if frame[1]:
+                    yield frame[1]
+            else:
+                count = frame[3]
+                if count:
+                    yield ", " if frame[2] and count % 2 == 0 else " "
+                frame[3] = count + 1
+                writer = cache.get(item.__class__)
+                if writer is None:
+                    writer = resolve_writer(item.__class__)
+                encoded = writer(item)
+                break
+        else:
+            return
+
+def iterencode_memo(obj):
+    '''like iterencode but the text of a collection reachable more than
+    once from obj, like the ones loads(share=True) returns, is built the
+    first time and written as is after that'''
+    shared = shared_subtrees(obj)
+    memo = {}
+    # pieces of the shared collections being written, given out once none is
+    pieces = []
+    capturing = 0
+    stack = []
+    cache = writer_cache
+    item_id = id(obj)
+    encoded = encode_value(obj)
+
+    while True:
+        if encoded.__class__ is tuple:
+            start, items, end, pairs = encoded
+            if item_id in shared:
+                capture = len(pieces)
+                capturing += 1
+            else:
+                capture = None
+            if start:
+                pieces.append(start)
+            stack.append([iter(items), end, pairs, 0, capture, item_id])
+        else:
+            pieces.append(encoded)
+
+        while stack:
+            frame = stack[-1]
+            item = next(frame[0], DONE)
+            if item is DONE:
+                stack.pop()
+                if frame[1]:
+                    pieces.append(frame[1])
+                capture = frame[4]
+                if capture is not None:
+                    text = memo[frame[5]] = "".join(pieces[capture:])
+                    pieces[capture:] = [text]
+                    capturing -= 1
+            else:
+                count = frame[3]
+                if count:
+                    pieces.append(", " if frame[2] and count % 2 == 0
+                            else " ")
+                frame[3] = count + 1
+                item_id = id(item)
+                encoded = memo.get(item_id)
+                if encoded is None:
+                    writer = cache.get(item.__class__)
+                    if writer is None:
+                        writer = resolve_writer(item.__class__)
+                    encoded = writer(item)
+                break
+        else:
+            for piece in pieces:
+                yield piece
+            return
+
+        if not capturing and len(pieces) > 64:
+            for piece in pieces:
+                yield piece
+            pieces = []
+
+BUFFER_SIZE = 64 * 1024
+
+def dump(obj, fp, buffer_size=BUFFER_SIZE, memo=False):
+    '''write the edn representation of obj to the file like object fp,
+    pieces are buffered and written in chunks of about buffer_size, memo
+    writes repeated subtrees like iterencode_memo'''
+    pending = []
+    size = 0
+    for piece in (iterencode_memo if memo else iterencode)(obj):
+        pending.append(piece)
+        size += len(piece)
+        if size >= buffer_size:
+            fp.write("".join(pending))
+            pending = []
+            size = 0
+
+    if pending:
+        fp.write("".join(pending))
+
+def dumps(obj, memo=False):
+    return "".join((iterencode_memo if memo else iterencode)(obj))
 
 @pg.error
-def error_handler(token):
-    raise ValueError("Ran into a %s where it wasn't expected" % token.gettokentype())
+def error_handler(state, token):
+    error = unexpected(token.gettokentype())
+    error.source_pos = token.getsourcepos()
+    raise error
 
 if __name__ == "__main__":
     #show_lex('{:foo 1 "bar" 1.2 :baz true false nil [1 #{}] (2 []) key #mg.value 42}')
@@ -0,0 +1,214 @@
+'''on disk cache of http responses for the http subcommand
+
+entries are keyed by method, url and a hash of the request body, each one is
+a file with a json line of metadata followed by the response body already
+converted to edn, so a hit writes the file out without touching the network
+or the transit reader. Freshness follows Cache-Control max-age and Expires,
+stale entries are revalidated with If-None-Match and If-Modified-Since, the
+least recently used entries are evicted when the cache grows over its size'''
+from __future__ import print_function
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "transito",
+        "http")
+
+DEFAULT_SIZE_MB = 64
+
+# headers of a 304 response that replace the stored ones
+REVALIDATED_HEADERS = ("cache-control", "expires", "etag", "last-modified",
+        "date")
+
+def cache_key(method, url, body):
+    '''hex digest for a request, body is the encoded request body'''
+    body_hash = hashlib.sha256(body or "").hexdigest()
+    return hashlib.sha256("\n".join((method.upper(), url,
+        body_hash))).hexdigest()
+
+def parse_cache_control(value):
+    '''"max-age=60, no-cache" -> {"max-age": "60", "no-cache": None}'''
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+def parse_http_date(value):
+    '''seconds since the epoch for an http date, None if it's not one'''
+    from email.utils import parsedate_tz, mktime_tz
+    parsed = parsedate_tz(value or "")
+    return mktime_tz(parsed) if parsed else None
+
+def header(headers, name):
+    '''value of header name in a list of (name, value) pairs'''
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+def lifetime(headers):
+    '''seconds the response is fresh for, from max-age or Expires'''
+    directives = parse_cache_control(header(headers, "cache-control"))
+    if "no-cache" in directives:
+        return 0
+
+    max_age = directives.get("max-age")
+    if max_age is not None:
+        try:
+            return max(int(max_age), 0)
+        except ValueError:
+            return 0
+
+    expires = parse_http_date(header(headers, "expires"))
+    if expires is not None:
+        date = parse_http_date(header(headers, "date")) or time.time()
+        return max(expires - date, 0)
+
+    return 0
+
+def is_storable(status, headers):
+    '''only complete responses that allow it and can be used again, either
+    while fresh or after revalidating'''
+    directives = parse_cache_control(header(headers, "cache-control"))
+    if status != 200 or "no-store" in directives:
+        return False
+
+    return lifetime(headers) > 0 or \
+            header(headers, "etag") is not None or \
+            header(headers, "last-modified") is not None
+
+class CacheEntry(object):
+    '''a stored response, headers is a list of (name, value) pairs and body
+    the converted body as written'''
+
+    def __init__(self, status, headers, body, stored=None):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored = time.time() if stored is None else stored
+
+    def is_fresh(self, now=None):
+        now = time.time() if now is None else now
+        return now - self.stored < lifetime(self.headers)
+
+    def validators(self):
+        '''conditional request headers to revalidate the entry'''
+        conditions = {}
+        etag = header(self.headers, "etag")
+        if etag is not None:
+            conditions["If-None-Match"] = etag
+
+        last_modified = header(self.headers, "last-modified")
+        if last_modified is not None:
+            conditions["If-Modified-Since"] = last_modified
+
+        return conditions
+
+    def revalidated(self, headers):
+        '''update the entry with the headers of a 304 response'''
+        updates = [(name, value) for name, value in headers
+                if name.lower() in REVALIDATED_HEADERS]
+        names = set(name.lower() for name, _ in updates)
+        self.headers = [(name, value) for name, value in self.headers
+                if name.lower() not in names] + updates
+        self.stored = time.time()
+
+    def to_file(self, handle):
+        meta = {"status": self.status, "headers": self.headers,
+                "stored": self.stored}
+        handle.write(json.dumps(meta))
+        handle.write("\n")
+        handle.write(self.body)
+
+    @classmethod
+    def from_file(cls, handle):
+        meta = json.loads(handle.readline())
+        headers = [(str(name), str(value)) for name, value in meta["headers"]]
+        return cls(meta["status"], headers, handle.read(), meta["stored"])
+
+class RecordingOutput(object):
+    '''file like object that writes to out and keeps a copy of what was
+    written'''
+
+    def __init__(self, out):
+        self.out = out
+        self.parts = []
+
+    def write(self, data):
+        self.out.write(data)
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        self.parts.append(data)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+    def __getattr__(self, name):
+        return getattr(self.out, name)
+
+class ResponseCache(object):
+    '''directory of cache entries holding at most max_size bytes'''
+
+    def __init__(self, directory=DEFAULT_DIR,
+            max_size=DEFAULT_SIZE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        '''return the entry for key or None, marks it as recently used'''
+        path = self.path(key)
+        try:
+            with open(path, "rb") as handle:
+                entry = CacheEntry.from_file(handle)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        return entry
+
+    def put(self, key, entry):
+        '''store entry under key, written to a temporary file and renamed
+        so readers never see half an entry'''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as handle:
+            entry.to_file(handle)
+        os.rename(temp_path, self.path(key))
+        self.evict()
+
+    def entries(self):
+        '''[(last used, size, path)] of the stored entries'''
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            found.append((info.st_mtime, info.st_size, path))
+        return found
+
+    def evict(self):
+        '''remove the least recently used entries until the cache fits'''
+        found = sorted(self.entries())
+        total = sum(size for _, size, _ in found)
+        for _, size, path in found:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
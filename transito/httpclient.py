@@ -0,0 +1,447 @@
+'''http helpers for the http subcommand
+
+run_load sends the same request many times from a pool of threads, each with
+its own keep-alive session, and collects the latency of every request'''
+from __future__ import print_function
+
+import sys
+import time
+import threading
+
+# upper bounds in ms of the latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+        10000)
+
+HISTOGRAM_WIDTH = 40
+
+def new_session():
+    '''return a requests session that keeps one connection alive'''
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+            pool_maxsize=1)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def percentile(values, fraction):
+    '''nearest rank percentile of a sorted list'''
+    if not values:
+        return 0.0
+    index = min(int(fraction * len(values) + 0.5), len(values)) - 1
+    return values[max(index, 0)]
+
+class LoadResult(object):
+    '''latencies in seconds, status code counts and errors of a load run'''
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.error_messages = {}
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, latency, status=None, error=None):
+        with self.lock:
+            self.latencies.append(latency)
+            if error is None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            else:
+                self.errors += 1
+                message = "%s: %s" % (type(error).__name__, error)
+                self.error_messages[message] = \
+                        self.error_messages.get(message, 0) + 1
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        throughput = self.requests / self.elapsed if self.elapsed else 0.0
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "statuses": dict(self.statuses),
+            "elapsed": self.elapsed,
+            "throughput": throughput,
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0
+        }
+
+    def histogram(self):
+        '''return [(upper bound in ms or None, count)] for the latencies'''
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for latency in self.latencies:
+            latency_ms = latency * 1000
+            for index, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms < bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+
+        return list(zip(LATENCY_BUCKETS_MS + (None,), counts))
+
+class Tickets(object):
+    '''hands out request slots to the workers until repeat requests were
+    taken or the deadline passed'''
+
+    def __init__(self, repeat=None, deadline=None):
+        self.remaining = repeat
+        self.deadline = deadline
+        self.lock = threading.Lock()
+
+    def take(self):
+        if self.deadline is not None and time.time() >= self.deadline:
+            return False
+        elif self.remaining is None:
+            return True
+
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+def load_worker(session, tickets, result, method, url, body, headers):
+    while tickets.take():
+        start = time.time()
+        try:
+            resp = session.request(method, url, data=body, headers=headers)
+            # read the whole body so the connection can be reused
+            resp.content
+        except Exception as error:
+            result.add(time.time() - start, error=error)
+        else:
+            result.add(time.time() - start, resp.status_code)
+
+def run_load(method, url, body, headers, repeat=None, concurrency=1,
+        duration=None, session_factory=new_session):
+    '''send the request repeat times or for duration seconds, whichever
+    comes first, from concurrency threads, body is sent as is so it's only
+    encoded once by the caller'''
+    if repeat is None and duration is None:
+        repeat = 1
+
+    deadline = time.time() + duration if duration is not None else None
+    tickets = Tickets(repeat, deadline)
+    result = LoadResult()
+    sessions = [session_factory() for _ in range(concurrency)]
+    workers = [threading.Thread(target=load_worker, args=(session, tickets,
+        result, method.upper(), url, body, headers)) for session in sessions]
+
+    start = time.time()
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+    result.elapsed = time.time() - start
+
+    for session in sessions:
+        session.close()
+
+    return result
+
+def format_load_report(result):
+    '''return the summary and latency histogram of a load run as text'''
+    summary = result.summary()
+    lines = [
+        "Requests: %d in %.2f s, %.1f req/s" % (summary["requests"],
+            summary["elapsed"], summary["throughput"]),
+        "Errors: %d" % summary["errors"]
+    ]
+
+    for status, count in sorted(summary["statuses"].items()):
+        lines.append("Status %s: %d" % (status, count))
+
+    for message, count in sorted(result.error_messages.items()):
+        lines.append("Error %s: %d" % (message, count))
+
+    lines.append("Latency: p50 %.2f ms, p90 %.2f ms, p99 %.2f ms, max %.2f ms"
+            % tuple(summary[name] * 1000 for name in ("p50", "p90", "p99",
+                "max")))
+    lines.append("")
+
+    histogram = result.histogram()
+    used = [index for index, (_, count) in enumerate(histogram) if count]
+    if used:
+        histogram = histogram[used[0]:used[-1] + 1]
+    largest = max(count for _, count in histogram) or 1
+    for bound, count in histogram:
+        if bound is None:
+            label = ">= %d ms" % LATENCY_BUCKETS_MS[-1]
+        else:
+            label = "< %d ms" % bound
+        bar = "#" * int(round(float(count) / largest * HISTOGRAM_WIDTH))
+        lines.append("%10s %8d %s" % (label, count, bar))
+
+    return "\n".join(lines)
+
+STREAM_CHUNK_SIZE = 16 * 1024
+END = object()
+
+class QueueWriter(object):
+    '''file like object that puts what is written on a queue in chunks of
+    about STREAM_CHUNK_SIZE bytes'''
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.pending = []
+        self.size = 0
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        self.pending.append(data)
+        self.size += len(data)
+        if self.size >= STREAM_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.queue.put("".join(self.pending))
+            self.pending = []
+            self.size = 0
+
+if sys.version_info[0] == 2:
+    # the three argument raise doesn't compile in python 3
+    exec("def reraise(error_type, error, traceback):\n"
+            "    raise error_type, error, traceback\n")
+else:
+    def reraise(error_type, error, traceback):
+        raise error.with_traceback(traceback)
+
+def produce(fn, args, queue):
+    writer = QueueWriter(queue)
+    try:
+        fn(*(args + (writer,)))
+        writer.flush()
+        queue.put(END)
+    except BaseException:
+        # with the traceback, raised again in the reading thread
+        queue.put((END, sys.exc_info()))
+
+def stream_output(fn, *args):
+    '''yield what fn(*args + (out,)) writes to out while it runs in a thread,
+    at most a few chunks are buffered, errors are raised at the end'''
+    from Queue import Queue
+    queue = Queue(maxsize=4)
+    producer = threading.Thread(target=produce, args=(fn, args, queue))
+    producer.daemon = True
+    producer.start()
+
+    while True:
+        chunk = queue.get()
+        if chunk is END:
+            break
+        elif chunk.__class__ is tuple and chunk[0] is END:
+            reraise(*chunk[1])
+        yield chunk
+
+    producer.join()
+
+def json_texts(chunks):
+    '''split an iterable of strings in the complete top level json texts it
+    contains, texts may span chunks and follow each other with or without
+    whitespace in between'''
+    for text, _ in json_text_spans(chunks):
+        yield text
+
+def json_text_spans(chunks):
+    '''like json_texts but yields (text, end), end is the offset right
+    after the text in the whole stream'''
+    pending = []
+    depth = 0
+    in_string = False
+    escaped = False
+    started = False
+    # offset of the current chunk in the stream
+    offset = 0
+
+    for chunk in chunks:
+        start = 0
+        for index, char in enumerate(chunk):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+                    if depth == 0:
+                        pending.append(chunk[start:index + 1])
+                        yield "".join(pending).strip(), offset + index + 1
+                        pending = []
+                        start = index + 1
+                        started = False
+            elif char == '"':
+                in_string = True
+                started = True
+            elif char == "[" or char == "{":
+                depth += 1
+                started = True
+            elif char == "]" or char == "}":
+                depth -= 1
+                if depth == 0:
+                    pending.append(chunk[start:index + 1])
+                    yield "".join(pending).strip(), offset + index + 1
+                    pending = []
+                    start = index + 1
+                    started = False
+            elif char.isspace():
+                if depth == 0 and started:
+                    # end of a top level number, true, false or null
+                    pending.append(chunk[start:index])
+                    yield "".join(pending).strip(), offset + index
+                    pending = []
+                    start = index
+                    started = False
+            elif depth == 0:
+                started = True
+
+        pending.append(chunk[start:])
+        offset += len(chunk)
+
+    rest = "".join(pending).strip()
+    if rest:
+        yield rest, offset
+
+class ChunkTail(object):
+    '''iterates over chunks keeping the text read since the end of the
+    last value a reader consumed, so what it didn't read can be written as
+    is when it fails'''
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = []
+        # offset in the stream of pending[0] and of the end of the last value
+        self.base = 0
+        self.consumed = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.pending.append(chunk)
+            yield chunk
+
+    def consume(self, offset):
+        '''the text before offset was read'''
+        self.consumed = offset
+        while self.pending and self.base + len(self.pending[0]) <= offset:
+            self.base += len(self.pending.pop(0))
+
+    def text(self):
+        '''the text read after the last value consumed, without the
+        whitespace that separated them'''
+        return "".join(self.pending)[self.consumed - self.base:].lstrip()
+
+def utf8_chunks(chunks, encoding):
+    '''recode an iterable of byte strings in encoding to utf-8, characters
+    may span chunks'''
+    import codecs
+    decoder = codecs.getincrementaldecoder(encoding)("replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text.encode("utf-8")
+
+    text = decoder.decode("", True)
+    if text:
+        yield text.encode("utf-8")
+
+def is_utf8(encoding):
+    import codecs
+    return codecs.lookup(encoding or "utf-8").name in ("utf-8", "ascii")
+
+def media_type(content_type):
+    '''"application/json; charset=utf-8" -> "application/json"'''
+    return (content_type or "").split(";")[0].strip().lower()
+
+class BatchResult(object):
+    '''outcome of one request of a batch, value is what the handle function
+    returned for the response'''
+
+    def __init__(self, index, method, url, status=None, latency=0.0,
+            value=None, error=None):
+        self.index = index
+        self.method = method
+        self.url = url
+        self.status = status
+        self.latency = latency
+        self.value = value
+        self.error = error
+
+def batch_worker(session, tasks, results, handle):
+    while True:
+        task = tasks.get()
+        if task is None:
+            results.put(None)
+            return
+
+        index, method, url, body, headers = task
+        start = time.time()
+        try:
+            resp = session.request(method.upper(), url, data=body,
+                    headers=headers)
+            latency = time.time() - start
+            value = handle(resp)
+        except Exception as error:
+            results.put(BatchResult(index, method, url,
+                latency=time.time() - start, error=error))
+        else:
+            results.put(BatchResult(index, method, url, resp.status_code,
+                latency, value))
+
+def feed_batch(requests, tasks, workers, errors):
+    try:
+        for index, request in enumerate(requests):
+            tasks.put((index,) + tuple(request))
+    except Exception as error:
+        errors.append(error)
+    finally:
+        for _ in range(workers):
+            tasks.put(None)
+
+def run_batch(requests, concurrency=1, handle=None,
+        session_factory=new_session):
+    '''send each (method, url, body, headers) in requests from concurrency
+    threads, each with its own keep-alive session, and yield a BatchResult
+    for each as soon as it finishes, so not in input order
+
+    requests is consumed as the workers need more so it can be a lazy
+    reader over a big file, handle(resp) is called in the worker and
+    defaults to the response text'''
+    from Queue import Queue
+    handle = handle or (lambda resp: resp.text)
+    tasks = Queue(maxsize=concurrency * 2)
+    results = Queue()
+    errors = []
+    sessions = [session_factory() for _ in range(concurrency)]
+    threads = [threading.Thread(target=feed_batch,
+        args=(requests, tasks, concurrency, errors))]
+    threads.extend(threading.Thread(target=batch_worker,
+        args=(session, tasks, results, handle)) for session in sessions)
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        running = concurrency
+        while running:
+            result = results.get()
+            if result is None:
+                running -= 1
+            else:
+                yield result
+    finally:
+        for session in sessions:
+            session.close()
+
+    if errors:
+        raise errors[0]
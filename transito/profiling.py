@@ -0,0 +1,158 @@
+'''run a conversion under a profiler for --profile
+
+cProfile writes a pstats dump and a sampler records the call stack every
+millisecond of cpu time as flamegraph collapsed stacks, frames in the edn
+parser and writer are labelled with the edn construct they are working on,
+like edn.read_values[vector] or edn.iterencode[keyword]'''
+from __future__ import print_function
+
+import os
+import signal
+import cProfile
+
+SAMPLE_INTERVAL = 0.001
+
+# edn construct for each token type of the edn lexer
+TOKEN_CONSTRUCTS = {
+    "number": "integer",
+    "float": "float",
+    "nil": "nil",
+    "boolean": "boolean",
+    "string": "string",
+    "symbol": "symbol",
+    "ns_symbol": "symbol",
+    "colon": "keyword",
+    "char": "char",
+    "char_nl": "char",
+    "char_tab": "char",
+    "char_return": "char",
+    "char_space": "char",
+    "olist": "list",
+    "clist": "list",
+    "ovec": "vector",
+    "cvec": "vector",
+    "omap": "map",
+    "oset": "set",
+    "cmap": "map",
+    "tag": "tagged",
+    "ns_tag": "tagged"
+}
+
+COLLECTION_CONSTRUCTS = {
+    "olist": "list",
+    "ovec": "vector",
+    "omap": "map",
+    "oset": "set"
+}
+
+def writer_construct(obj):
+    '''name of the edn construct obj is written as, from its writer name'''
+    from . import edn
+    writer = edn.writer_cache.get(obj.__class__)
+    name = getattr(writer, "__name__", "")
+    if name.startswith("write_"):
+        return name[len("write_"):]
+    elif name == "encode_basestring":
+        return "string"
+    return obj.__class__.__name__
+
+def label_read_values(local_vars):
+    if local_vars.get("keyword"):
+        return "keyword"
+    return TOKEN_CONSTRUCTS.get(local_vars.get("token_type"))
+
+def label_close_collection(local_vars):
+    return COLLECTION_CONSTRUCTS.get(local_vars.get("kind"))
+
+def label_tagged(local_vars):
+    tag_name = local_vars.get("tag_name")
+    return "#" + tag_name if tag_name else None
+
+def label_iterencode(local_vars):
+    if "item" in local_vars:
+        return writer_construct(local_vars["item"])
+    elif "obj" in local_vars:
+        return writer_construct(local_vars["obj"])
+
+def label_encode_value(local_vars):
+    return writer_construct(local_vars["obj"])
+
+# (module, function) to a function that returns the construct a frame is
+# working on from its local variables
+LABELLERS = {
+    ("edn", "read_values"): label_read_values,
+    ("edn", "close_collection"): label_close_collection,
+    ("edn", "make_tagged_value"): label_tagged,
+    ("edn", "iterencode"): label_iterencode,
+    ("edn", "encode_value"): label_encode_value
+}
+
+def frame_label(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    name = code.co_name
+    label = module + "." + name
+    labeller = LABELLERS.get((module, name))
+
+    if labeller is not None:
+        try:
+            construct = labeller(frame.f_locals)
+        except Exception:
+            construct = None
+
+        if construct:
+            label += "[" + construct + "]"
+
+    return label
+
+class StackSampler(object):
+    '''count the call stacks seen every interval seconds of cpu time'''
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = {}
+        self.previous_handler = None
+
+    def sample(self, signum, frame):
+        labels = []
+        while frame is not None:
+            labels.append(frame_label(frame))
+            frame = frame.f_back
+
+        labels.reverse()
+        stack = ";".join(labels)
+        self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def start(self):
+        self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+
+    def write_collapsed(self, out):
+        '''write "frame;frame;frame count" lines, the input of
+        flamegraph.pl and speedscope'''
+        for stack, count in sorted(self.counts.items()):
+            out.write("%s %d\n" % (stack, count))
+
+def collapsed_path(path):
+    return path + ".collapsed"
+
+def run(fn, path, *args):
+    '''call fn(*args) under the profilers, the pstats dump is written to path
+    and the collapsed stacks next to it, returns what fn returns'''
+    profiler = cProfile.Profile()
+    sampler = StackSampler()
+    sampler.start()
+    profiler.enable()
+
+    try:
+        return fn(*args)
+    finally:
+        profiler.disable()
+        sampler.stop()
+        profiler.dump_stats(path)
+        with open(collapsed_path(path), "w") as out:
+            sampler.write_collapsed(out)
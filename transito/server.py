@@ -0,0 +1,299 @@
+'''conversion daemon for the serve subcommand
+
+POST /<conversion> converts the request body with the same handler the cli
+uses for that conversion (POST /e2t with edn returns transit), GET /metrics
+returns request counts and latencies as json. The server listens on a local
+tcp port or a unix socket and handles requests on a fixed pool of threads,
+so codecs are loaded once instead of once per process'''
+from __future__ import print_function
+
+import os
+import json
+import stat
+import time
+import threading
+import collections
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import UnixStreamServer
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7080
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_REQUEST_SIZE = 10 * 1024 * 1024
+
+KEEP_ALIVE_TIMEOUT = 10
+
+# longest chunk size or trailer line read from a chunked body
+MAX_CHUNK_LINE = 1024
+
+# latencies kept for the percentiles in /metrics
+LATENCY_WINDOW = 10000
+
+class Metrics(object):
+    '''request counts and latencies of a running server'''
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.statuses = collections.Counter()
+        self.conversions = collections.Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def add(self, action, status, latency, bytes_in=0, bytes_out=0):
+        with self.lock:
+            self.requests += 1
+            self.statuses[status] += 1
+            if action is not None:
+                self.conversions[action] += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.latencies.append(latency)
+
+    def result(self):
+        from .httpclient import percentile
+        with self.lock:
+            latencies = sorted(self.latencies)
+            result = {
+                "uptime": time.time() - self.started,
+                "requests": self.requests,
+                "statuses": dict((str(status), count)
+                    for status, count in self.statuses.items()),
+                "conversions": dict(self.conversions),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out
+            }
+
+        result["latency_ms"] = dict((name, percentile(latencies, fraction)
+            * 1000) for name, fraction in (("p50", 0.5), ("p90", 0.9),
+                ("p99", 0.99), ("max", 1)))
+        return result
+
+class BodyError(Exception):
+    '''a request body that can't be read, answered with status, with close
+    the connection is closed since where the body ends is unknown'''
+
+    def __init__(self, status, message, close=True):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+        self.close = close
+
+def read_chunked(rfile, max_size):
+    '''read a chunked transfer encoded body, at most max_size bytes'''
+    parts = []
+    size = 0
+    while True:
+        line = rfile.readline(MAX_CHUNK_LINE)
+        try:
+            length = int(line.split(";")[0], 16)
+        except ValueError:
+            length = -1
+        if length < 0 or not line.endswith("\n"):
+            raise BodyError(400, "invalid chunked body\n")
+        elif length == 0:
+            break
+
+        size += length
+        if size > max_size:
+            raise BodyError(413, "request over %d bytes\n" % max_size)
+        chunk = rfile.read(length)
+        if len(chunk) < length or rfile.readline(MAX_CHUNK_LINE).strip():
+            raise BodyError(400, "invalid chunked body\n")
+        parts.append(chunk)
+
+    # trailers until an empty line
+    while rfile.readline(MAX_CHUNK_LINE).strip():
+        pass
+    return "".join(parts)
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # idle keep-alive connections give their worker back after this
+    timeout = KEEP_ALIVE_TIMEOUT
+    # buffer the status line, headers and body, handle_one_request flushes
+    # them once per response, small writes on a keep-alive connection wait
+    # for delayed acks with nagle's algorithm
+    wbufsize = -1
+
+    def address_string(self):
+        # unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else "-"
+
+    def log_message(self, *args):
+        if self.server.access_log:
+            BaseHTTPRequestHandler.log_message(self, *args)
+
+    def send_body(self, status, body, content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def do_GET(self):
+        start = time.time()
+        if self.path == "/metrics":
+            body = json.dumps(self.server.metrics.result())
+            status = 200
+            size = self.send_body(status, body, "application/json")
+        else:
+            status = 404
+            size = self.send_body(status, "not found\n")
+        self.server.metrics.add(None, status, time.time() - start, 0, size)
+
+    def read_body(self):
+        '''the request body, sent with a Content-Length or in chunks'''
+        max_size = self.server.max_request_size
+        encoding = self.headers.getheader("Transfer-Encoding")
+        if encoding is not None and \
+                encoding.split(",")[-1].strip().lower() == "chunked":
+            return read_chunked(self.rfile, max_size)
+
+        length = self.headers.getheader("Content-Length")
+        if length is None:
+            raise BodyError(411, "Content-Length required\n", False)
+
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise BodyError(400, "invalid Content-Length\n")
+        elif length > max_size:
+            # the body isn't read
+            raise BodyError(413, "request over %d bytes\n" % max_size)
+        return self.rfile.read(length)
+
+    def do_POST(self):
+        from . import transito
+        start = time.time()
+        path, _, query = self.path.partition("?")
+        action = path.strip("/")
+        bytes_in = 0
+
+        if action not in dict(transito.CONVERSIONS):
+            status = 404
+            size = self.send_body(status, "unknown conversion %s\n" % action)
+            action = None
+        else:
+            try:
+                body = self.read_body()
+            except BodyError as error:
+                if error.close:
+                    self.close_connection = 1
+                status = error.status
+                size = self.send_body(status, error.message)
+            else:
+                bytes_in = len(body)
+                try:
+                    output = transito.convert_text(action, body,
+                            "verbose" in query)
+                except Exception as error:
+                    status = 400
+                    size = self.send_body(status,
+                            transito.error_message(error) + "\n")
+                else:
+                    status = 200
+                    size = self.send_body(status, output,
+                            transito.CONTENT_TYPE_FOR_CHAR[action[-1]])
+
+        self.server.metrics.add(action, status, time.time() - start,
+                bytes_in, size)
+
+# a classic class like SocketServer's mixins, object in the bases would come
+# before the server classes and hide their __init__
+class PoolMixIn:
+    '''handle requests on a fixed pool of threads instead of a thread per
+    request, accepted connections wait in a bounded queue'''
+
+    workers = DEFAULT_WORKERS
+
+    def start_workers(self):
+        from Queue import Queue
+        self.pending = Queue(maxsize=self.workers * 16)
+        self.threads = [threading.Thread(target=self.work)
+                for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop_workers(self):
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def work(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self.pending.put((request, client_address))
+
+class TCPConversionServer(PoolMixIn, HTTPServer):
+    allow_reuse_address = True
+
+class UnixConversionServer(PoolMixIn, UnixStreamServer):
+    pass
+
+def remove_stale_socket(path):
+    '''remove the socket a previous server left at path, anything else
+    there is left alone and is an error'''
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return
+
+    if not stat.S_ISSOCK(mode):
+        raise ValueError("%s exists and is not a socket" % path)
+    os.remove(path)
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None,
+        workers=DEFAULT_WORKERS, max_request_size=DEFAULT_MAX_REQUEST_SIZE,
+        access_log=False):
+    '''return a server listening on socket_path if given, else on host and
+    port, call start_workers before serve_forever'''
+    if socket_path is not None:
+        remove_stale_socket(socket_path)
+        server = UnixConversionServer(socket_path, ConversionHandler)
+    else:
+        server = TCPConversionServer((host, port), ConversionHandler)
+
+    server.workers = workers
+    server.max_request_size = max_request_size
+    server.access_log = access_log
+    server.metrics = Metrics()
+    return server
+
+def address(server):
+    if isinstance(server.server_address, tuple):
+        return "http://%s:%d/" % server.server_address[:2]
+    return server.server_address
+
+def serve(server, log):
+    '''serve until interrupted'''
+    server.start_workers()
+    print("transito serving on %s" % address(server), file=log)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.stop_workers()
+        if not isinstance(server.server_address, tuple):
+            os.remove(server.server_address)
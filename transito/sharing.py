@@ -0,0 +1,177 @@
+'''structural sharing of repeated subtrees
+
+HashConser replaces collections and tagged values equal to one seen before
+with the instance seen first, so a document that repeats the same map a
+thousand times holds it once. The shared instances are only safe while
+nobody mutates them, which is why sharing is opt in.
+
+shared_subtrees finds the collections reachable more than once from a value,
+the writers use it to write the text for those once and reuse it'''
+from __future__ import print_function
+
+import collections
+
+from transit.transit_types import Keyword, Symbol, TaggedValue, Boolean
+
+# values compared by equality in the structural keys, type is part of the
+# key since 1, 1.0 and True are equal
+SCALAR_TYPES = frozenset([str, unicode, int, long, float, bool, type(None),
+    Keyword, Symbol, Boolean])
+
+SEQUENCE_TYPES = (list, tuple)
+SET_TYPES = (set, frozenset)
+
+# distinct subtrees kept by a HashConser before it starts over
+SHARE_LIMIT = 256 * 1024
+
+class HashConser(object):
+    '''returns the first instance seen of each structurally equal
+    collection or tagged value, children must already be shared so they can
+    be compared by identity'''
+
+    def __init__(self, limit=SHARE_LIMIT):
+        self.limit = limit
+        self.instances = {}
+        self.hits = 0
+
+    def child_key(self, child):
+        cls = child.__class__
+        if cls in SCALAR_TYPES:
+            return (cls, child)
+        # a shared instance, kept alive by its entry in instances
+        return id(child)
+
+    def key(self, obj):
+        '''structural key of obj or None if it isn't a collection'''
+        cls = obj.__class__
+        child_key = self.child_key
+        if isinstance(obj, SEQUENCE_TYPES):
+            return (cls, tuple([child_key(item) for item in obj]))
+        elif isinstance(obj, collections.Mapping):
+            return (cls, frozenset([(child_key(key), child_key(value))
+                for key, value in obj.items()]))
+        elif isinstance(obj, SET_TYPES):
+            return (cls, frozenset([child_key(item) for item in obj]))
+        elif isinstance(obj, TaggedValue):
+            rep = obj.rep
+            if isinstance(rep, SEQUENCE_TYPES):
+                rep_key = tuple([child_key(item) for item in rep])
+            else:
+                rep_key = child_key(rep)
+            return (cls, obj.tag, rep_key)
+        return None
+
+    def share(self, obj):
+        '''return the shared instance equal to obj, whose children were
+        shared already'''
+        try:
+            key = self.key(obj)
+        except TypeError:
+            # unhashable scalars, nothing to share
+            return obj
+
+        if key is None:
+            return obj
+
+        instance = self.instances.get(key)
+        if instance is not None:
+            self.hits += 1
+            return instance
+
+        if len(self.instances) >= self.limit:
+            self.instances.clear()
+        self.instances[key] = obj
+        return obj
+
+    def tree(self, obj):
+        '''return obj with every subtree shared, for values built by other
+        readers, the tree is walked bottom up without recursion'''
+        # frames of [value, children, shared children]
+        stack = [[obj, children(obj), []]]
+        while True:
+            frame = stack[-1]
+            child = next(frame[1], DONE)
+            if child is not DONE:
+                stack.append([child, children(child), []])
+                continue
+
+            stack.pop()
+            value = self.share(rebuild(frame[0], frame[2]))
+            if not stack:
+                return value
+            stack[-1][2].append(value)
+
+DONE = object()
+NO_CHILDREN = iter(())
+
+def children(obj):
+    '''iterator over the values directly inside obj, in rebuild's order'''
+    if obj.__class__ in SCALAR_TYPES:
+        return NO_CHILDREN
+    elif isinstance(obj, SEQUENCE_TYPES) or isinstance(obj, SET_TYPES):
+        return iter(obj)
+    elif isinstance(obj, collections.Mapping):
+        return (item for pair in obj.items() for item in pair)
+    elif isinstance(obj, TaggedValue):
+        if isinstance(obj.rep, SEQUENCE_TYPES):
+            return iter(obj.rep)
+        return iter((obj.rep,))
+    return NO_CHILDREN
+
+def rebuild(obj, items):
+    '''obj with its children replaced by items, obj itself when they are
+    the same objects'''
+    if not items:
+        return obj
+    elif isinstance(obj, SEQUENCE_TYPES) or isinstance(obj, SET_TYPES):
+        original = obj
+    elif isinstance(obj, collections.Mapping):
+        original = [item for pair in obj.items() for item in pair]
+    elif isinstance(obj.rep, SEQUENCE_TYPES):
+        original = obj.rep
+    else:
+        original = (obj.rep,)
+
+    if all(new is old for new, old in zip(items, original)):
+        return obj
+    elif isinstance(obj, (tuple, frozenset)):
+        return obj.__class__(items)
+    elif isinstance(obj, list):
+        obj[:] = items
+    elif isinstance(obj, set):
+        obj.clear()
+        obj.update(items)
+    elif isinstance(obj, dict):
+        itr = iter(items)
+        obj.clear()
+        obj.update(zip(itr, itr))
+    elif isinstance(obj, collections.Mapping):
+        itr = iter(items)
+        return obj.__class__(zip(itr, itr))
+    elif isinstance(obj.rep, list):
+        obj.rep[:] = items
+    elif isinstance(obj.rep, tuple):
+        obj.rep = tuple(items)
+    else:
+        obj.rep = items[0]
+    return obj
+
+def shared_subtrees(obj):
+    '''ids of the collections and tagged values reachable more than once
+    from obj, shared subtrees are not walked again'''
+    seen = set()
+    shared = set()
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if item.__class__ in SCALAR_TYPES:
+            continue
+
+        item_id = id(item)
+        if item_id in seen:
+            shared.add(item_id)
+            continue
+        seen.add(item_id)
+        pending.extend(children(item))
+
+    return shared
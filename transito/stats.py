@@ -0,0 +1,259 @@
+'''per run statistics for --stats
+
+time is charged to the innermost phase running, so the read time inside
+parsing and the write time inside serializing are reported apart, the report
+is printed as text or as a single json line'''
+from __future__ import print_function
+
+import sys
+import json
+import time
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss_kb():
+    '''peak resident memory of this process in KB, None if unknown'''
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KB, macos bytes
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+def text_size(data):
+    if isinstance(data, unicode):
+        return len(data.encode("utf-8"))
+    return len(data)
+
+class PhaseTimer(object):
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.stats.enter(self.name)
+
+    def __exit__(self, *exc_info):
+        self.stats.exit()
+
+class NullTimer(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+NULL_TIMER = NullTimer()
+
+class CountingInput(object):
+    '''file like object that counts the bytes read from handle and the time
+    spent reading them'''
+
+    def __init__(self, handle, stats):
+        self.handle = handle
+        self.stats = stats
+
+    def read(self, *args):
+        with self.stats.phase("read"):
+            data = self.handle.read(*args)
+        self.stats.bytes_in += len(data)
+        return data
+
+    def readline(self, *args):
+        with self.stats.phase("read"):
+            line = self.handle.readline(*args)
+        self.stats.bytes_in += len(line)
+        return line
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
+
+class CountingOutput(object):
+    '''file like object that counts the bytes written to out and the time
+    spent writing them'''
+
+    def __init__(self, out, stats):
+        self.out = out
+        self.stats = stats
+
+    def write(self, data):
+        with self.stats.phase("write"):
+            self.out.write(data)
+        self.stats.bytes_out += text_size(data)
+
+    def __getattr__(self, name):
+        return getattr(self.out, name)
+
+class TimedHandler(object):
+    '''transit read handler that charges its calls to the tags phase'''
+
+    def __init__(self, handler, stats):
+        self.handler = handler
+        self.stats = stats
+
+    def from_rep(self, rep):
+        with self.stats.phase("tags"):
+            return self.handler.from_rep(rep)
+
+class Stats(object):
+    '''wall and cpu time per phase, bytes in and out and records for a run'''
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.timers = {}
+        self.stack = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.records = 0
+        self.start_wall = time.time()
+        self.start_cpu = time.clock()
+
+    def phase(self, name):
+        '''context manager that charges the time inside it to phase name'''
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(self, name)
+        return timer
+
+    def charge(self, frame, wall, cpu):
+        totals = self.phases.get(frame[0])
+        if totals is None:
+            totals = self.phases[frame[0]] = [0.0, 0.0, 0]
+        totals[0] += wall - frame[1]
+        totals[1] += cpu - frame[2]
+        frame[1] = wall
+        frame[2] = cpu
+
+    def enter(self, name):
+        wall = time.time()
+        cpu = time.clock()
+        if self.stack:
+            self.charge(self.stack[-1], wall, cpu)
+        self.stack.append([name, wall, cpu])
+
+    def exit(self):
+        wall = time.time()
+        cpu = time.clock()
+        frame = self.stack.pop()
+        self.charge(frame, wall, cpu)
+        self.phases[frame[0]][2] += 1
+        if self.stack:
+            self.stack[-1][1] = wall
+            self.stack[-1][2] = cpu
+
+    def timed(self, iterable, name):
+        '''iterate over iterable charging the time to get each item to
+        phase name'''
+        itr = iter(iterable)
+        timer = self.phase(name)
+        while True:
+            with timer:
+                try:
+                    item = next(itr)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, records=1):
+        self.records += records
+
+    def count_input(self, size):
+        self.bytes_in += size
+
+    def wrap_input(self, handle):
+        return CountingInput(handle, self)
+
+    def wrap_output(self, out):
+        return CountingOutput(out, self)
+
+    def tag_handler(self, handler):
+        return TimedHandler(handler, self)
+
+    def result(self, action=None):
+        '''return the statistics as a dict'''
+        wall = time.time() - self.start_wall
+        cpu = time.clock() - self.start_cpu
+        phases = OrderedDict()
+        for name, (phase_wall, phase_cpu, calls) in self.phases.items():
+            phases[name] = {"wall": phase_wall, "cpu": phase_cpu,
+                    "calls": calls}
+
+        return OrderedDict([
+            ("action", action),
+            ("phases", phases),
+            ("wall", wall),
+            ("cpu", cpu),
+            ("bytes_in", self.bytes_in),
+            ("bytes_out", self.bytes_out),
+            ("records", self.records),
+            ("records_per_s", self.records / wall if wall else 0.0),
+            ("peak_rss_kb", peak_rss_kb())
+        ])
+
+    def report(self, out, fmt="text", action=None):
+        '''write the statistics to out as text or as a json line'''
+        result = self.result(action)
+        if fmt == "json":
+            print(json.dumps(result), file=out)
+            return
+
+        print("%-10s %10s %10s %8s" % ("phase", "wall ms", "cpu ms", "calls"),
+                file=out)
+        other_wall = result["wall"]
+        other_cpu = result["cpu"]
+        for name, phase in result["phases"].items():
+            print("%-10s %10.2f %10.2f %8d" % (name, phase["wall"] * 1000,
+                phase["cpu"] * 1000, phase["calls"]), file=out)
+            other_wall -= phase["wall"]
+            other_cpu -= phase["cpu"]
+
+        print("%-10s %10.2f %10.2f" % ("other", other_wall * 1000,
+            other_cpu * 1000), file=out)
+        print("%-10s %10.2f %10.2f" % ("total", result["wall"] * 1000,
+            result["cpu"] * 1000), file=out)
+        print("%d bytes in, %d bytes out, %d records, %.1f records/s" % (
+            result["bytes_in"], result["bytes_out"], result["records"],
+            result["records_per_s"]), file=out)
+        if result["peak_rss_kb"] is not None:
+            print("peak memory %d KB" % result["peak_rss_kb"], file=out)
+
+class NullStats(object):
+    '''Stats that records nothing, used when --stats is not given'''
+
+    def phase(self, name):
+        return NULL_TIMER
+
+    def timed(self, iterable, name):
+        return iterable
+
+    def count(self, records=1):
+        pass
+
+    def count_input(self, size):
+        pass
+
+    def wrap_input(self, handle):
+        return handle
+
+    def wrap_output(self, out):
+        return out
+
+    def tag_handler(self, handler):
+        return handler
+
+NULL_STATS = NullStats()
@@ -0,0 +1,579 @@
+'''transit json codec that works directly on the values of the json module
+
+the lossy decoder turns a transit json document into the json form written
+by t2j in a single pass, without building transit values first, the encoder
+writes transit json without going through transit's Writer'''
+from __future__ import print_function
+
+import re
+import json
+from collections import OrderedDict
+from StringIO import StringIO
+
+from transit.rolling_cache import encode_key, CACHE_SIZE, MIN_SIZE_CACHEABLE
+from transit.transit_types import Keyword, Symbol, TaggedValue, Boolean, \
+        frozendict, URI, Link
+
+class Tag(object):
+    '''a "~#tag" string, only valid as the head of a tagged value'''
+    def __init__(self, tag):
+        self.tag = tag
+
+    def __repr__(self):
+        return "Tag(%r)" % self.tag
+
+SPECIAL_NUMBERS = {
+    "NaN": float("nan"),
+    "INF": float("inf"),
+    "-INF": float("-inf")
+}
+
+def not_serializable(value):
+    return TypeError(repr(value) + " is not JSON serializable")
+
+def lossy_scalar(string):
+    '''decode an escaped "~" string to its lossy json value'''
+    marker = string[1]
+    rep = string[2:]
+
+    if marker == ":":
+        return ":" + rep
+    elif marker == "$":
+        return "~" + rep
+    elif marker == "~" or marker == "^" or marker == "`":
+        return string[1:]
+    elif marker == "#":
+        return Tag(rep)
+    elif marker == "_":
+        return None
+    elif marker == "?":
+        return rep == "t"
+    elif marker == "i" or marker == "n":
+        return int(rep)
+    elif marker == "d":
+        return float(rep)
+    elif marker == "z":
+        return SPECIAL_NUMBERS[rep]
+    elif marker == "'":
+        return rep
+    else:
+        # decimals, dates, uuids, uris, bytes and unknown scalars have no
+        # json form
+        raise not_serializable(string)
+
+def lossy_tagged(tag, rep):
+    '''decode a tagged value to its lossy json value'''
+    if tag in ("list", "vector", "set"):
+        return list(rep)
+    elif tag == "char" or tag == "'":
+        return rep
+    else:
+        raise not_serializable("~#" + tag)
+
+PLAIN_TYPES = (int, long, float, bool, type(None))
+MARKERS = ("~", "^")
+NAME_MARKERS = (":", "$", "#")
+
+class LossyDecoder(object):
+    '''decode the values of a parsed transit json document into the json form
+    written by t2j, keywords become ":name" strings, symbols "~name", chars
+    one character strings and lists, vectors and sets arrays
+
+    the key cache mirrors transit's RollingCache so documents decode exactly
+    like they do with transit's Reader'''
+
+    def __init__(self):
+        self.key_to_value = {}
+        self.value_to_key = {}
+        # keywords, symbols and tags repeat a lot, keep their values
+        self.names = {}
+
+    def encache(self, string):
+        if len(self.key_to_value) > CACHE_SIZE:
+            self.value_to_key = {}
+        elif string in self.value_to_key:
+            return
+
+        key = encode_key(len(self.key_to_value))
+        self.key_to_value[key] = string
+        self.value_to_key[string] = key
+
+    def decode_string(self, string, as_map_key):
+        '''expand cache references, cache cacheable strings and decode
+        escapes, tags are returned as Tag instances'''
+        if string[:1] == "^" and string != "^ ":
+            if string in self.key_to_value:
+                string = self.key_to_value[string]
+            elif len(string) >= MIN_SIZE_CACHEABLE and as_map_key:
+                self.encache(string)
+        elif len(string) >= MIN_SIZE_CACHEABLE and \
+                (as_map_key or string[:2] in ("~#", "~$", "~:")):
+            self.encache(string)
+
+        if string[:1] == "~":
+            names = self.names
+            if string in names:
+                return names[string]
+
+            value = lossy_scalar(string)
+            if string[1] in NAME_MARKERS:
+                names[string] = value
+            return value
+        else:
+            return string
+
+    def decode_head(self, node, as_map_key):
+        if isinstance(node, basestring):
+            return self.decode_string(node, as_map_key)
+        else:
+            return self.decode(node, as_map_key)
+
+    def decode(self, node, as_map_key=False):
+        if isinstance(node, basestring):
+            value = self.decode_string(node, as_map_key)
+            if value.__class__ is Tag:
+                raise not_serializable(node)
+            return value
+        elif isinstance(node, list):
+            return self.decode_list(node, as_map_key)
+        elif isinstance(node, dict):
+            return self.decode_dict(node, as_map_key)
+        else:
+            return node
+
+    def decode_list(self, node, as_map_key):
+        if not node:
+            return []
+
+        if node[0] == "^ ":
+            result = OrderedDict()
+            itr = iter(node)
+            next(itr)
+            for key, value in zip(itr, itr):
+                key = self.decode(key, True)
+                result[key] = self.decode(value, as_map_key)
+            return result
+
+        head = self.decode_head(node[0], as_map_key)
+        if head.__class__ is Tag:
+            return lossy_tagged(head.tag, self.decode(node[1], as_map_key))
+
+        result = [head]
+        append = result.append
+        decode = self.decode
+        for item in node[1:]:
+            tp = item.__class__
+            if tp in PLAIN_TYPES:
+                append(item)
+            elif tp is unicode and item[:1] not in MARKERS and \
+                    (not as_map_key or len(item) < MIN_SIZE_CACHEABLE):
+                # strings that are neither escaped nor cached
+                append(item)
+            else:
+                append(decode(item, as_map_key))
+        return result
+
+    def decode_dict(self, node, as_map_key):
+        if len(node) == 1:
+            key, value = next(iter(node.items()))
+            head = self.decode_head(key, True)
+            if head.__class__ is Tag:
+                return lossy_tagged(head.tag, self.decode(value, as_map_key))
+            return OrderedDict([(head, self.decode(value, False))])
+
+        result = OrderedDict()
+        for key, value in node.items():
+            key = self.decode(key, True)
+            result[key] = self.decode(value, False)
+        return result
+
+def load_lossy(handle):
+    '''read a transit json document from handle as lossy json values'''
+    node = json.load(handle, object_pairs_hook=OrderedDict)
+    return LossyDecoder().decode(node)
+
+def loads_lossy(data):
+    '''read a transit json document from a string as lossy json values'''
+    node = json.loads(data, object_pairs_hook=OrderedDict)
+    return LossyDecoder().decode(node)
+
+ESCAPE = re.compile(r'[\x00-\x1f\\"]')
+ESCAPE_DCT = {
+    '\\': '\\\\',
+    '"': '\\"',
+    '\b': '\\b',
+    '\f': '\\f',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\t': '\\t',
+}
+
+for code in range(0x20):
+    ESCAPE_DCT.setdefault(chr(code), "\\u{0:04x}".format(code))
+
+def replace_escape(match):
+    return ESCAPE_DCT[match.group(0)]
+
+def json_string(string):
+    if ESCAPE.search(string):
+        string = ESCAPE.sub(replace_escape, string)
+    return '"' + string + '"'
+
+MAX_INT = pow(2, 53) - 1
+MIN_INT = -pow(2, 53) + 1
+ESCAPABLE = ("^", "~", "`")
+CACHEABLE_PREFIXES = ("~#", "~$", "~:")
+STRINGABLE_TYPES = (type(None), bool, Boolean, basestring, int, long, float,
+        Keyword, Symbol)
+
+def is_stringable(key):
+    '''true if key can be written as a string, maps with only stringable keys
+    are written as maps, the others as cmaps'''
+    return isinstance(key, STRINGABLE_TYPES) or \
+        (isinstance(key, TaggedValue) and len(key.tag) == 1)
+
+LOSSY_PLAIN_TYPES = (basestring, int, long, float, bool, type(None))
+NATIVE_TYPES = STRINGABLE_TYPES + (list, tuple, dict, set, frozenset,
+        TaggedValue)
+# tagged values transit writes with their own handler
+HANDLED_TYPES = (URI, Link)
+
+def lossy_value(value):
+    '''convert a value read from edn to the json form t2j writes for it,
+    without encoding it as transit first'''
+    if isinstance(value, LOSSY_PLAIN_TYPES):
+        return value
+    elif isinstance(value, Keyword):
+        return ":" + value.str
+    elif isinstance(value, Symbol):
+        return "~" + value.str
+    elif isinstance(value, Boolean):
+        return bool(value)
+    elif isinstance(value, dict):
+        result = OrderedDict()
+        for key, item in value.items():
+            if not is_stringable(key):
+                # written as a cmap, which has no json form
+                raise not_serializable(value)
+            result[lossy_value(key)] = lossy_value(item)
+        return result
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        return [lossy_value(item) for item in value]
+    elif isinstance(value, TaggedValue) and \
+            not isinstance(value, HANDLED_TYPES):
+        return lossy_tagged(value.tag, lossy_value(value.rep))
+    else:
+        raise not_serializable(value)
+
+class TransitEncoder(object):
+    '''write values as transit json, the output is the same transit's Writer
+    produces for them
+
+    the values edn.loads and json.load return are written natively, other
+    types like the dates, uuids and decimals transit's Reader returns go
+    through transit's write handlers, verbose writes the json_verbose flavour
+    and cache=False disables the key cache, cache_hits and cache_misses count
+    how many cacheable strings were written as a cache reference or stored in
+    the cache
+
+    memo reuses the text of collections reachable more than once in a
+    document, once writing them again no longer changes the key cache'''
+
+    def __init__(self, verbose=False, cache=True, memo=False):
+        self.verbose = verbose
+        self.cache_enabled = cache and not verbose
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.memo_enabled = memo
+        # bumped when the key cache starts over, memoized text with cache
+        # references is only valid in the generation it was written in
+        self.generation = 0
+        self.documents = 0
+        self.writers = {
+            type(None): self.write_nil,
+            bool: self.write_boolean,
+            Boolean: self.write_boolean,
+            str: self.write_string,
+            unicode: self.write_string,
+            int: self.write_int,
+            long: self.write_long,
+            float: self.write_float,
+            Keyword: self.write_keyword,
+            Symbol: self.write_symbol,
+            list: self.write_array,
+            tuple: self.write_array,
+            dict: self.write_map,
+            OrderedDict: self.write_map,
+            frozendict: self.write_map,
+            set: self.write_set,
+            frozenset: self.write_set,
+            TaggedValue: self.write_tagged,
+            URI: self.write_handled,
+            Link: self.write_handled
+        }
+        self.bases = list(self.writers.items())
+        # transit's write handlers, only loaded for types without a writer
+        self.handlers = None
+        self.reset()
+
+    def reset(self):
+        self.pieces = []
+        self.cache_size = 0
+        self.value_to_key = {}
+        self.generation += 1
+        self.shared = None
+        self.memo = {}
+
+    def stats(self):
+        cacheable = self.cache_hits + self.cache_misses
+        return {
+            "documents": self.documents,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_ratio": float(self.cache_hits) / cacheable
+                if cacheable else 0.0
+        }
+
+    def encache(self, string):
+        '''return the cache reference for string if it was seen, otherwise
+        store it and return it, mirrors transit's RollingCache'''
+        if self.cache_size > CACHE_SIZE:
+            self.value_to_key = {}
+            self.generation += 1
+        elif string in self.value_to_key:
+            self.cache_hits += 1
+            return self.value_to_key[string]
+
+        self.cache_misses += 1
+        self.value_to_key[string] = encode_key(self.cache_size)
+        self.cache_size += 1
+        return string
+
+    def emit_string(self, string, as_map_key):
+        if self.cache_enabled and len(string) >= MIN_SIZE_CACHEABLE and \
+                (as_map_key or string[:2] in CACHEABLE_PREFIXES):
+            string = self.encache(string)
+
+        self.pieces.append(json_string(string))
+
+    def emit_tagged(self, tag, rep):
+        if self.verbose:
+            self.pieces.append("{" + json_string("~#" + tag) + ":")
+            self.write(rep, False)
+            self.pieces.append("}")
+        else:
+            self.pieces.append("[")
+            self.emit_string("~#" + tag, False)
+            self.pieces.append(",")
+            self.write(rep, False)
+            self.pieces.append("]")
+
+    def write(self, obj, as_map_key):
+        writer = self.writers.get(obj.__class__)
+        if writer is None:
+            for cls, base_writer in self.bases:
+                if isinstance(obj, cls):
+                    break
+            else:
+                base_writer = self.write_handled
+            writer = self.writers[obj.__class__] = base_writer
+
+        if self.shared and not as_map_key and id(obj) in self.shared:
+            self.write_memo(obj, writer)
+        else:
+            writer(obj, as_map_key)
+
+    def write_memo(self, obj, writer):
+        '''write a collection seen more than once in the document, its text
+        is kept once writing it added nothing to the key cache, after that
+        the same text is written again'''
+        pieces = self.pieces
+        entry = self.memo.get(id(obj))
+        if entry is not None and entry[0] == self.generation:
+            pieces.append(entry[1])
+            return
+
+        start = len(pieces)
+        misses = self.cache_misses
+        writer(obj, False)
+        if self.cache_misses == misses:
+            text = "".join(pieces[start:])
+            pieces[start:] = [text]
+            self.memo[id(obj)] = (self.generation, text)
+
+    def handler(self, obj):
+        '''return transit's write handler for obj'''
+        if self.handlers is None:
+            from transit.write_handlers import WriteHandler
+            self.handlers = WriteHandler()
+
+        try:
+            handler = self.handlers[obj]
+        except KeyError:
+            raise TypeError("Don't know how to encode %r of type %s" %
+                    (obj, type(obj)))
+
+        if self.verbose and hasattr(handler, "verbose_handler"):
+            handler = handler.verbose_handler()
+        return handler
+
+    def is_stringable(self, obj):
+        if isinstance(obj, NATIVE_TYPES) and \
+                not isinstance(obj, HANDLED_TYPES):
+            return is_stringable(obj)
+        return len(self.handler(obj).tag(obj)) == 1
+
+    def write_handled(self, obj, as_map_key):
+        '''write obj with transit's write handler for its type'''
+        handler = self.handler(obj)
+        tag = handler.tag(obj)
+        rep = handler.rep(obj)
+
+        if tag == "array":
+            self.write_array(rep, as_map_key)
+        elif tag == "map":
+            self.write_map(rep, as_map_key)
+        elif len(tag) != 1:
+            if as_map_key:
+                raise ValueError("Cannot be used as a map key: %r" % obj)
+            self.emit_tagged(tag, rep)
+        else:
+            if not isinstance(rep, basestring):
+                rep = handler.string_rep(obj)
+                if not isinstance(rep, basestring):
+                    raise ValueError("Cannot be encoded as string: %r" % obj)
+            self.emit_string("~" + tag + rep, as_map_key)
+
+    def write_nil(self, obj, as_map_key):
+        if as_map_key:
+            self.emit_string("~_", True)
+        else:
+            self.pieces.append("null")
+
+    def write_boolean(self, obj, as_map_key):
+        if as_map_key:
+            self.emit_string("~?t" if obj else "~?f", True)
+        else:
+            self.pieces.append("true" if obj else "false")
+
+    def write_string(self, obj, as_map_key):
+        if obj[:1] in ESCAPABLE:
+            obj = "~" + obj
+        self.emit_string(obj, as_map_key)
+
+    def write_int(self, obj, as_map_key):
+        if as_map_key or obj > MAX_INT or obj < MIN_INT:
+            self.emit_string("~i" + str(obj), as_map_key)
+        else:
+            self.pieces.append(unicode(obj))
+
+    def write_long(self, obj, as_map_key):
+        self.emit_string("~n" + str(obj), as_map_key)
+
+    def write_float(self, obj, as_map_key):
+        if obj != obj:
+            self.emit_string("~zNaN", as_map_key)
+        elif obj == float("inf"):
+            self.emit_string("~zINF", as_map_key)
+        elif obj == float("-inf"):
+            self.emit_string("~z-INF", as_map_key)
+        elif as_map_key:
+            self.emit_string("~d" + str(obj), as_map_key)
+        else:
+            self.pieces.append(unicode(obj))
+
+    def write_keyword(self, obj, as_map_key):
+        self.emit_string("~:" + obj.str, as_map_key)
+
+    def write_symbol(self, obj, as_map_key):
+        self.emit_string("~$" + obj.str, as_map_key)
+
+    def write_array(self, obj, as_map_key):
+        pieces = self.pieces
+        pieces.append("[")
+        first = True
+        for item in obj:
+            if first:
+                first = False
+            else:
+                pieces.append(",")
+            self.write(item, False)
+        pieces.append("]")
+
+    def write_map(self, obj, as_map_key):
+        pieces = self.pieces
+        items = obj.items()
+
+        if not all(self.is_stringable(key) for key, _ in items):
+            # keys that are collections or tagged values
+            if self.verbose:
+                pieces.append("{" + json_string("~#cmap") + ":")
+            else:
+                pieces.append("{")
+                self.emit_string("~#cmap", True)
+                pieces.append(":")
+            self.write_array([item for pair in items for item in pair], False)
+            pieces.append("}")
+        elif self.verbose:
+            pieces.append("{")
+            first = True
+            for key, value in items:
+                if first:
+                    first = False
+                else:
+                    pieces.append(",")
+                self.write(key, True)
+                pieces.append(":")
+                self.write(value, False)
+            pieces.append("}")
+        else:
+            pieces.append('["^ "')
+            for key, value in items:
+                pieces.append(",")
+                self.write(key, True)
+                pieces.append(",")
+                self.write(value, False)
+            pieces.append("]")
+
+    def write_set(self, obj, as_map_key):
+        self.emit_tagged("set", tuple(obj))
+
+    def write_tagged(self, obj, as_map_key):
+        if len(obj.tag) != 1:
+            if as_map_key:
+                raise ValueError("Cannot be used as a map key: %r" % obj)
+            self.emit_tagged(obj.tag, obj.rep)
+        elif isinstance(obj.rep, basestring):
+            self.emit_string("~" + obj.tag + obj.rep, as_map_key)
+        else:
+            raise ValueError("Cannot be encoded as string: %r" % obj)
+
+    def encode(self, obj, out):
+        '''write obj as a transit json document to the file like object out'''
+        self.reset()
+        if self.memo_enabled:
+            from .sharing import shared_subtrees
+            self.shared = shared_subtrees(obj)
+
+        if self.is_stringable(obj):
+            self.emit_tagged("'", obj)
+        else:
+            self.write(obj, False)
+
+        self.documents += 1
+        out.write("".join(self.pieces))
+        self.pieces = []
+
+    def encodes(self, obj):
+        '''return obj as a transit json document'''
+        out = StringIO()
+        self.encode(obj, out)
+        return out.getvalue()
+
+def dump(obj, out, verbose=False, cache=True, memo=False):
+    '''write obj as a transit json document to the file like object out'''
+    TransitEncoder(verbose, cache, memo).encode(obj, out)
+
+def dumps(obj, verbose=False, cache=True, memo=False):
+    '''return obj as a transit json document'''
+    return TransitEncoder(verbose, cache, memo).encodes(obj)
@@ -2,29 +2,50 @@
 '''Command Line Tool to Work with Transit Format'''
 from __future__ import print_function
 
+import os
 import sys
 import json
 import argparse
 import pprint
+import threading
 
 from StringIO import StringIO
 
-import requests
-from . import edn
-from transit.writer import Writer
-from transit.reader import Reader
 import transit.transit_types
 
+from .stats import Stats, NULL_STATS
+
+# requests, edn and the transit reader and writer are imported by the
+# functions that use them so each subcommand only pays for what it needs
+
+FORMAT_NAMES = {
+    'e': 'edn',
+    'j': 'json',
+    't': 'transit'
+}
+
+CONVERSIONS = [
+    ('t2j', 'convert transit to json'),
+    ('j2t', 'convert json to transit'),
+    ('e2t', 'convert edn to transit'),
+    ('t2e', 'convert transit to edn'),
+    ('e2e', 'edn roundtrip'),
+    ('e2j', 'convert edn to json'),
+    ('j2e', 'convert json to edn'),
+    ('j2j', 'json roundtrip'),
+    ('t2t', 'transit roundtrip')
+]
+
 def get_arg_parser():
     '''build the cli arg parser'''
     parser = argparse.ArgumentParser(description='Transit CLI')
+    parser.add_argument('--stats', action='store_const', const='text',
+            help='print time per phase (read, lex, parse, tags, serialize, '
+            'write), bytes, records and memory to stderr')
+    parser.add_argument('--stats-json', action='store_const', const='json',
+            dest='stats', help='like --stats but as a json line')
 
     subparsers = parser.add_subparsers()
-    p_t2j = subparsers.add_parser('t2j', help='convert transit to json')
-    p_j2t = subparsers.add_parser('j2t', help='convert json to transit')
-    p_e2t = subparsers.add_parser('e2t', help='convert edn to transit')
-    p_t2e = subparsers.add_parser('t2e', help='convert transit to edn')
-    p_e2e = subparsers.add_parser('e2e', help='edn roundtrip')
 
     p_http = subparsers.add_parser('http',
             help='make http requests with transit data')
@@ -34,33 +55,143 @@ def get_arg_parser():
     p_http.add_argument('conversion', help='input convertion (e2t etc)')
     p_http.add_argument('path',
             help='path to data file, use - to read from stdin')
+    p_http.add_argument('--repeat', type=int, default=None,
+            help='send the request this many times and report latencies')
+    p_http.add_argument('--concurrency', type=int, default=1,
+            help='send repeated requests from this many connections')
+    p_http.add_argument('--duration', type=float, default=None,
+            help='send repeated requests for this many seconds')
+    p_http.add_argument('--no-chunked', action='store_true',
+            help='convert the whole body before sending it with a '
+            'Content-Length instead of streaming it')
+    p_http.add_argument('--cache', nargs='?', const='', default=None,
+            metavar='DIR', help='cache responses in DIR (default '
+            '~/.cache/transito/http) following Cache-Control and '
+            'revalidating stale ones, use --cache=DIR before the url')
+    p_http.add_argument('--cache-size', type=int, default=64, metavar='MB',
+            help='evict the least recently used responses over this size')
+    add_profile_arg(p_http)
+
+    p_batch = subparsers.add_parser('http-batch',
+            help='replay a file of http requests concurrently')
+    p_batch.set_defaults(action='http-batch')
+    p_batch.add_argument('path', help='path to an edn file of request maps '
+            'or a json file with one per line, use - to read from stdin')
+    p_batch.add_argument('--concurrency', type=int, default=4,
+            help='send requests from this many connections')
+    p_batch.add_argument('--input-format', choices=('edn', 'json'),
+            default=None,
+            help='format of the requests (default json for .ndjson, .jsonl '
+            'and .json files, else edn)')
+    add_profile_arg(p_batch)
 
-    p_t2j.set_defaults(action='t2j')
-    p_t2j.add_argument('path',
-            help='path to transit file, use - to read from stdin')
+    p_serve = subparsers.add_parser('serve',
+            help='run a conversion server, POST /e2t etc, GET /metrics')
+    p_serve.set_defaults(action='serve')
+    p_serve.add_argument('--host', default='127.0.0.1',
+            help='address to listen on (default 127.0.0.1)')
+    p_serve.add_argument('--port', type=int, default=7080,
+            help='port to listen on (default 7080)')
+    p_serve.add_argument('--socket', default=None, metavar='PATH',
+            help='listen on a unix socket instead of a port')
+    p_serve.add_argument('--workers', type=int, default=4,
+            help='threads handling requests')
+    p_serve.add_argument('--max-request-size', type=int,
+            default=10 * 1024 * 1024, metavar='BYTES',
+            help='reject bodies over this size (default 10 MB)')
+    p_serve.add_argument('--access-log', action='store_true',
+            help='log every request to stderr')
+    add_profile_arg(p_serve)
 
-    p_j2t.set_defaults(action='j2t')
-    p_j2t.add_argument('path',
-            help='path to json file, use - to read from stdin')
+    p_pipe = subparsers.add_parser('pipe',
+            help='convert framed documents from stdin, one result per frame')
+    p_pipe.set_defaults(action='pipe')
+    p_pipe.add_argument('--framing', choices=PIPE_FRAMINGS, default='lines',
+            help='"e2t [1 2]" per line or "e2t 5" followed by 5 bytes')
+    p_pipe.add_argument('--verbose', action='store_true',
+            help='write the json_verbose transit flavour')
+    add_profile_arg(p_pipe)
 
-    p_e2t.set_defaults(action='e2t')
-    p_e2t.add_argument('path',
-            help='path to edn file, use - to read from stdin')
+    p_check = subparsers.add_parser('check',
+            help='check that edn, json or transit is well formed without '
+            'converting it')
+    p_check.set_defaults(action='check')
+    p_check.add_argument('format', choices=sorted(FORMAT_NAMES.values()),
+            help='format of the input')
+    p_check.add_argument('path',
+            help='path to the file to check, use - to read from stdin')
+    p_check.add_argument('--lines', action='store_true',
+            help='check one record per line and report every bad line')
+    p_check.add_argument('--limit', type=int, default=None,
+            help='stop after this many records in --lines mode')
+    p_check.add_argument('--jobs', type=int, default=1,
+            help='check chunks of a --lines file in this many processes')
+    add_profile_arg(p_check)
 
-    p_t2e.set_defaults(action='t2e')
-    p_t2e.add_argument('path',
-            help='path to transit file, use - to read from stdin')
+    for action, help_text in CONVERSIONS:
+        conversion_parser = subparsers.add_parser(action, help=help_text)
+        conversion_parser.set_defaults(action=action)
+        conversion_parser.add_argument('path',
+                help='path to %s file, use - to read from stdin' %
+                FORMAT_NAMES[action[0]])
+        add_lines_args(conversion_parser)
+        add_profile_arg(conversion_parser)
+        conversion_parser.add_argument('--share', action='store_true',
+                help='read equal subtrees into one shared instance and '
+                'write the text of repeated subtrees once')
 
-    p_e2e.set_defaults(action='e2e')
-    p_e2e.add_argument('path',
-            help='path to edn file, use - to read from stdin')
+        if action[-1] == 't':
+            conversion_parser.add_argument('--verbose', action='store_true',
+                    help='write the json_verbose transit flavour')
 
     return parser
 
+PROFILE_PATH = 'transito.prof'
+
+def add_profile_arg(parser):
+    '''add the --profile option to a subparser'''
+    parser.add_argument('--profile', nargs='?', const=PROFILE_PATH,
+            default=None, metavar='FILE',
+            help='write a pstats profile to FILE (default %s) and collapsed '
+            'stacks to FILE.collapsed, use --profile=FILE before the path' %
+            PROFILE_PATH)
+
+def add_lines_args(parser):
+    '''add the options for line delimited conversions to a subparser'''
+    parser.add_argument('--lines', action='store_true',
+            help='convert one record per line')
+    parser.add_argument('--limit', type=int, default=None,
+            help='stop after this many records in --lines mode')
+    parser.add_argument('--skip-errors', action='store_true',
+            help='report and skip records that fail in --lines mode')
+    parser.add_argument('--jobs', type=int, default=1,
+            help='convert chunks of a --lines file in this many processes')
+    parser.add_argument('--unordered', action='store_true',
+            help='with --jobs, write results as chunks finish')
+
 def parse_args():
     '''parse arguments and return them'''
     parser = get_arg_parser()
     args = parser.parse_args()
+
+    if getattr(args, 'concurrency', 1) < 1:
+        parser.error('--concurrency must be at least 1')
+    elif getattr(args, 'workers', 1) < 1:
+        parser.error('--workers must be at least 1')
+    elif args.action == 'serve' and args.stats:
+        parser.error('--stats is not supported with serve, see /metrics')
+
+    if getattr(args, 'jobs', 1) > 1:
+        if not args.lines:
+            parser.error('--jobs needs --lines')
+        elif args.path == '-':
+            parser.error('--jobs needs a file path, not stdin')
+        elif args.limit is not None:
+            parser.error('--limit is not supported with --jobs')
+
+    if getattr(args, 'share', False) and args.lines:
+        parser.error('--share is not supported with --lines')
+
     return args
 
 class EdnListHandler(object):
@@ -105,109 +236,936 @@ def json_encode_transit(obj):
 
     raise TypeError(repr(obj) + " is not JSON serializable")
 
-def read_transit(path, handlers=None):
-    if path == '-':
+# statistics for the current run, a Stats instance with --stats
+run_stats = NULL_STATS
+
+def open_input(path):
+    '''open path, - for stdin, a file like object is used as it is'''
+    if hasattr(path, 'read'):
+        handle = path
+    elif path == '-':
         handle = sys.stdin
     else:
         handle = open(path)
 
-    return read_transit_handle(handle, handlers)
+    return run_stats.wrap_input(handle)
+
+def read_transit(path, handlers=None):
+    return read_transit_handle(open_input(path), handlers)
 
 def read_transit_string(transit_str, handlers=None):
     return read_transit_handle(StringIO(transit_str), handlers)
 
-def read_transit_handle(handle, handlers=None):
+# (handler registry) -> (stats, Reader) for the readers built so far
+transit_readers = {}
+
+def transit_reader(handlers=None):
+    '''return the transit json Reader for handlers, built once and reused,
+    reading keeps no state in the Reader so it can be shared by threads'''
+    key = tuple(sorted(handlers.items())) if handlers else ()
+    cached = transit_readers.get(key)
+    if cached is not None and cached[0] is run_stats:
+        return cached[1]
+
+    from transit.reader import Reader
     reader = Reader("json")
+    # every Decoder starts with the same decoders dict, registering on it
+    # would change how every later Reader decodes
+    decoder = reader.reader.decoder
+    decoder.options = dict(decoder.options)
+    decoder.decoders = decoder.options["decoders"] = dict(decoder.decoders)
+
+    for tag, handler in (handlers or {}).items():
+        reader.register(tag, run_stats.tag_handler(handler))
 
-    if handlers:
-        for tag, handler in handlers.items():
-            reader.register(tag, handler)
+    transit_readers[key] = (run_stats, reader)
+    return reader
 
-    return reader.read(handle)
+def read_transit_handle(handle, handlers=None):
+    return transit_reader(handlers).read(handle)
+
+def read_lossy_transit(path):
+    '''read the transit file at path straight into the json values written
+    by t2j'''
+    from . import transit_json
+    return transit_json.load_lossy(open_input(path))
+
+def read_lossy_transit_string(transit_str):
+    from . import transit_json
+    return transit_json.loads_lossy(transit_str)
 
 def read_edn(path):
-    if path == '-':
-        handle = sys.stdin
+    from . import edn
+    return edn.loads(open_input(path).read(), accept_unknown_tags=True)
+
+def read_edn_string(edn_str):
+    from . import edn
+    tokens = run_stats.timed(edn.tokenize(edn_str), "lex")
+    return edn.parse_tokens(tokens, edn.State(None, True), edn_str)
+
+def read_lossy_edn_string(edn_str):
+    '''read an edn string straight into the json values written by e2j'''
+    from . import transit_json
+    return transit_json.lossy_value(read_edn_string(edn_str))
+
+def read_edn_values(path, share=False):
+    '''yield each top level value in the edn file at path as it is read,
+    regular files are memory mapped instead of read'''
+    from . import edn
+    handle = open_input(path)
+    buf = edn.map_file(handle)
+    if buf is None:
+        source = edn.Window()
+        tokens = edn.tokenize_chunks(
+                iter(lambda: handle.read(edn.CHUNK_SIZE), ""), source)
     else:
-        handle = open(path)
+        # the map isn't read through the counting handle
+        run_stats.count_input(len(buf))
+        source = buf
+        tokens = edn.tokenize(buf)
 
-    return edn.loads(handle.read(), accept_unknown_tags=True)
+    # lexing is its own phase, inside parse
+    return edn.read_values(run_stats.timed(tokens, "lex"),
+            edn.State(None, True, share), source)
 
 def write_transit(value):
+    return cached_encoder().encodes(value)
+
+def write_transit_verbose(value):
+    return cached_encoder(True).encodes(value)
+
+def write_transit_writer(value, protocol="json"):
+    '''write value with transit's Writer, kept to compare the native
+    encoder against'''
+    from transit.writer import Writer
     sio = StringIO()
-    writer = Writer(sio, "json")
+    writer = Writer(sio, protocol)
     writer.write(value)
     return sio.getvalue()
 
+# encoders keep the document being written, so each thread gets its own
+thread_state = threading.local()
+
+def cached_encoder(verbose=False, memo=False):
+    '''return this thread's transit json encoder for the flavour, built
+    once and reused for every document'''
+    encoders = getattr(thread_state, 'encoders', None)
+    if encoders is None:
+        encoders = thread_state.encoders = {}
+
+    encoder = encoders.get((verbose, memo))
+    if encoder is None:
+        from . import transit_json
+        encoder = encoders[(verbose, memo)] = \
+                transit_json.TransitEncoder(verbose, memo=memo)
+    return encoder
+
+def transit_encoder(args):
+    '''return a transit json encoder for the flavour selected in args'''
+    return cached_encoder(getattr(args, 'verbose', False),
+            getattr(args, 'share', False))
+
+def dump_transit(encoder, value, out):
+    with run_stats.phase("serialize"):
+        encoder.encode(value, out)
+        out.write("\n")
+
 def write_json(value):
     return json.dumps(value, default=json_encode_transit)
 
 def write_edn(value):
+    from . import edn
     return edn.dumps(value)
 
+def dump_edn(value, out, memo=False):
+    from . import edn
+    with run_stats.phase("serialize"):
+        edn.dump(value, out, memo=memo)
+        out.write("\n")
+
+def write_line(out, text):
+    out.write(text)
+    out.write("\n")
+
 def read_json(path):
-    if path == '-':
-        handle = sys.stdin
-    else:
-        handle = open(path)
+    return json.load(open_input(path))
+
+def read_document(read, path, *args, **kwargs):
+    '''read the single document at path with read, counted as one record,
+    with share equal subtrees become one instance'''
+    with run_stats.phase("parse"):
+        value = read(path, *args)
+        if kwargs.get("share"):
+            from .sharing import HashConser
+            value = HashConser().tree(value)
+    run_stats.count()
+    return value
 
-    return json.load(handle)
+def read_values(path, share=False):
+    '''iterate over the edn values at path, one record each'''
+    for value in run_stats.timed(read_edn_values(path, share), "parse"):
+        run_stats.count()
+        yield value
 
-def transit_to_json(args):
+def is_shared(args):
+    return getattr(args, 'share', False)
+
+def write_json_line(value, out):
+    with run_stats.phase("serialize"):
+        write_line(out, write_json(value))
+
+def transit_to_json(args, out):
     '''handler for transit to json action'''
-    value = read_transit(args.path, JSON_HANDLERS)
-    return write_json(value)
+    value = read_document(read_lossy_transit, args.path,
+            share=is_shared(args))
+    write_json_line(value, out)
 
-def transit_to_edn(args):
+def transit_to_edn(args, out):
     '''handler for transit to edn action'''
-    value = read_transit(args.path, EDN_HANDLERS)
-    return write_edn(value)
+    value = read_document(read_transit, args.path, EDN_HANDLERS,
+            share=is_shared(args))
+    dump_edn(value, out, is_shared(args))
 
-def json_to_transit(args):
+def json_to_transit(args, out):
     '''handler for json to transit action'''
-    value = read_json(args.path)
-    return write_transit(value)
+    value = read_document(read_json, args.path, share=is_shared(args))
+    dump_transit(transit_encoder(args), value, out)
+
+def edn_to_transit(args, out):
+    '''handler for edn to transit action, one transit document per edn
+    value in the input'''
+    encoder = transit_encoder(args)
+    for value in read_values(args.path, is_shared(args)):
+        dump_transit(encoder, value, out)
+
+def edn_to_edn(args, out):
+    '''handler for edn to edn action, one line per edn value in the input'''
+    share = is_shared(args)
+    for value in read_values(args.path, share):
+        dump_edn(value, out, share)
+
+def edn_to_json(args, out):
+    '''handler for edn to json action, one json document per edn value in
+    the input, written like t2j writes the transit for it'''
+    from . import transit_json
+    for value in read_values(args.path, is_shared(args)):
+        with run_stats.phase("serialize"):
+            value = transit_json.lossy_value(value)
+        write_json_line(value, out)
+
+def json_to_edn(args, out):
+    '''handler for json to edn action'''
+    value = read_document(read_json, args.path, share=is_shared(args))
+    dump_edn(value, out, is_shared(args))
 
-def edn_to_transit(args):
-    '''handler for edn to transit action'''
-    value = read_edn(args.path)
-    return write_transit(value)
+def json_to_json(args, out):
+    '''handler for json to json action'''
+    value = read_document(read_json, args.path, share=is_shared(args))
+    write_json_line(value, out)
+
+def transit_to_transit(args, out):
+    '''handler for transit to transit action'''
+    value = read_document(read_transit, args.path, share=is_shared(args))
+    dump_transit(transit_encoder(args), value, out)
+
+LINE_READERS = {
+    't2j': read_lossy_transit_string,
+    't2e': lambda line: read_transit_string(line, EDN_HANDLERS),
+    'j2t': json.loads,
+    'e2t': read_edn_string,
+    'e2e': read_edn_string,
+    'e2j': read_lossy_edn_string,
+    'j2e': json.loads,
+    'j2j': json.loads,
+    't2t': read_transit_string
+}
+
+LINE_WRITERS = {
+    'j': write_json,
+    't': write_transit,
+    'e': write_edn
+}
 
-def edn_to_edn(args):
-    '''handler for edn to transit action'''
-    value = read_edn(args.path)
-    return write_edn(value)
+def line_writer(action, verbose=False):
+    '''return the function that writes the results of action in --lines
+    mode'''
+    if verbose and action[-1] == 't':
+        return write_transit_verbose
+    return LINE_WRITERS[action[-1]]
 
-def format_response(resp):
-    lines = ["Status: " + str(resp.status_code)]
+BUFFER_SIZE = 64 * 1024
 
-    for name, value in resp.headers.items():
-        lines.append(name + ": " + str(value))
+def error_message(error):
+    message = getattr(error, 'message', None) or str(error)
+    return "%s: %s" % (type(error).__name__, message)
+
+def convert_lines(handle, action, out, limit=None, skip_errors=False,
+        offset=None, verbose=False):
+    '''convert each non empty line in handle with the conversion for action
+    and write one result per line to out, output is written in chunks of
+    about BUFFER_SIZE
+
+    returns a (records, errors) tuple, if skip_errors is false the first
+    error is raised, otherwise errors are reported by line number or, if
+    offset is the position of handle in the input, by byte offset, verbose
+    selects the json_verbose flavour for transit output'''
+    read = LINE_READERS[action]
+    write = line_writer(action, verbose)
+    parse_phase = run_stats.phase("parse")
+    serialize_phase = run_stats.phase("serialize")
+    pending = []
+    size = 0
+    records = 0
+    errors = 0
 
-    lines.append("")
     try:
-        data = read_transit_string(resp.text, EDN_HANDLERS)
-        lines.append(write_edn(data))
-    except Exception:
-        lines.append(resp.text)
+        for lineno, line in enumerate(handle, 1):
+            if limit is not None and records >= limit:
+                break
+
+            if offset is not None:
+                position = offset
+                offset += len(line)
+
+            line = line.strip()
+            if not line:
+                continue
+
+            records += 1
+            try:
+                with parse_phase:
+                    value = read(line)
+                with serialize_phase:
+                    result = write(value)
+            except Exception as error:
+                if not skip_errors:
+                    raise
+
+                errors += 1
+                if offset is None:
+                    where = "line %d" % lineno
+                else:
+                    where = "byte %d" % position
+                print("%s: %s" % (where, error_message(error)),
+                        file=sys.stderr)
+                continue
+
+            pending.append(result)
+            size += len(result)
+            if size >= BUFFER_SIZE:
+                pending.append("")
+                out.write("\n".join(pending))
+                pending = []
+                size = 0
+    finally:
+        # records converted before an error are written too
+        if pending:
+            pending.append("")
+            out.write("\n".join(pending))
+
+    return records, errors
+
+PARALLEL_CHUNK_SIZE = 4 * 1024 * 1024
+
+def split_ranges(path, parts, chunk_size=PARALLEL_CHUNK_SIZE):
+    '''return (start, end) byte ranges that split the file at path in at
+    least parts chunks of up to about chunk_size, ending after a newline'''
+    with open(path, 'rb') as handle:
+        handle.seek(0, 2)
+        size = handle.tell()
+        step = max(min(chunk_size, size // parts), 1)
+        ranges = []
+        start = 0
+
+        while start < size:
+            handle.seek(min(start + step, size))
+            handle.readline()
+            end = min(handle.tell(), size)
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+def convert_range(task):
+    '''convert the lines in a byte range of a file in a worker process,
+    returns (output, records, errors)'''
+    path, start, end, action, skip_errors, verbose = task
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+
+    out = StringIO()
+    try:
+        records, errors = convert_lines(StringIO(data), action, out,
+                skip_errors=skip_errors, offset=start, verbose=verbose)
+    except Exception as error:
+        # rply errors can't be unpickled in the parent process
+        raise ValueError("in bytes %d-%d: %s" %
+                (start, end, error_message(error)))
+
+    return out.getvalue(), records, errors
+
+def convert_parallel(path, action, out, jobs, skip_errors=False,
+        ordered=True, verbose=False):
+    '''convert the lines in the file at path like convert_lines but split in
+    byte ranges converted by a pool of jobs processes, results are written in
+    input order unless ordered is false
+
+    returns a (records, errors) tuple'''
+    import multiprocessing
+    tasks = [(path, start, end, action, skip_errors, verbose)
+            for start, end in split_ranges(path, jobs * 4)]
+    pool = multiprocessing.Pool(jobs)
+    records = 0
+    errors = 0
+
+    try:
+        if ordered:
+            results = pool.imap(convert_range, tasks)
+        else:
+            results = pool.imap_unordered(convert_range, tasks)
+
+        for output, chunk_records, chunk_errors in run_stats.timed(results,
+                "convert"):
+            out.write(output)
+            records += chunk_records
+            errors += chunk_errors
+
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return records, errors
+
+def lines_handler(args, out):
+    '''handler for any conversion in --lines mode'''
+    verbose = getattr(args, 'verbose', False)
+    if args.jobs > 1:
+        run_stats.count_input(os.path.getsize(args.path))
+        records, errors = convert_parallel(args.path, args.action, out,
+                args.jobs, args.skip_errors, not args.unordered, verbose)
+    else:
+        records, errors = convert_lines(open_input(args.path), args.action,
+                out, args.limit, args.skip_errors, verbose=verbose)
+
+    run_stats.count(records)
+
+    if args.skip_errors:
+        print("%d records, %d errors" % (records, errors), file=sys.stderr)
+
+class ResponseDecodeError(Exception):
+    '''a response body that doesn't match its content type, text is what
+    was read of the body after the last value that decoded'''
+
+    def __init__(self, error, text=""):
+        Exception.__init__(self, error_message(error))
+        self.text = text
+
+def read_json_bodies(chunks, decode):
+    '''yield decode(text) for each json text in a stream of text chunks'''
+    from .httpclient import ChunkTail, json_text_spans
+    tail = ChunkTail(chunks)
+    for text, end in json_text_spans(tail):
+        try:
+            value = decode(text)
+        except Exception as error:
+            raise ResponseDecodeError(error, tail.text())
+        tail.consume(end)
+        yield value
 
-    return "\n".join(lines)
+def read_transit_texts(chunks):
+    '''yield each transit document in a stream of text chunks'''
+    return read_json_bodies(chunks,
+            lambda text: read_transit_string(text, EDN_HANDLERS))
 
-def http_req(args):
+def read_json_texts(chunks):
+    '''yield each json document in a stream of text chunks'''
+    return read_json_bodies(chunks, json.loads)
+
+def read_edn_chunks(chunks):
+    '''yield each edn value in a stream of text chunks'''
+    from . import edn
+    from .httpclient import ChunkTail
+    tail = ChunkTail(chunks)
+    # the end of the last token read, a value is yielded right after its
+    # last token
+    last_end = [0]
+
+    def tokens(chunks):
+        for token in edn.tokenize_chunks(chunks, window):
+            last_end[0] = token[2]
+            yield token
+
+    window = edn.Window()
+    values = edn.read_values(tokens(tail), edn.State(None, True), window)
+    while True:
+        try:
+            value = next(values)
+        except StopIteration:
+            return
+        except Exception as error:
+            raise ResponseDecodeError(error, tail.text())
+        tail.consume(last_end[0])
+        yield value
+
+# media type of a response to the function that reads its body
+RESPONSE_READERS = {
+    'application/transit+json': read_transit_texts,
+    'application/json': read_json_texts,
+    'application/edn': read_edn_chunks
+}
+
+def write_head(status, headers, out):
+    '''write the status and the (name, value) header pairs of a response'''
+    write_line(out, "Status: " + str(status))
+    for name, value in headers:
+        write_line(out, name + ": " + str(value))
+    write_line(out, "")
+    out.flush()
+
+def write_response(resp, out):
+    '''write the status, headers and body of a streamed response'''
+    write_head(resp.status_code, resp.headers.items(), out)
+    write_body(resp, out)
+
+def write_body(resp, out):
+    '''write the body of a streamed response, each value in the body is
+    written as edn as soon as it was downloaded, bodies of other content
+    types are written as they are'''
+    from . import httpclient
+    chunks = run_stats.timed(
+            resp.iter_content(httpclient.STREAM_CHUNK_SIZE), "http")
+    read = RESPONSE_READERS.get(
+            httpclient.media_type(resp.headers.get('Content-Type')))
+
+    if read is not None:
+        # the readers take utf-8 like they do from files
+        if not httpclient.is_utf8(resp.encoding):
+            chunks = httpclient.utf8_chunks(chunks, resp.encoding)
+
+        try:
+            for value in read(chunks):
+                run_stats.count()
+                dump_edn(value, out)
+                out.flush()
+            return
+        except ResponseDecodeError as error:
+            print("error decoding response: %s" % error, file=sys.stderr)
+            out.write(error.text)
+
+    for text in chunks:
+        out.write(text)
+        out.flush()
+
+def is_load_test(args):
+    return getattr(args, 'repeat', None) is not None or \
+            getattr(args, 'duration', None) is not None or \
+            getattr(args, 'concurrency', 1) > 1
+
+def http_load(args, body, headers, out):
+    '''send the already encoded body repeatedly and write the latency
+    report'''
+    from . import httpclient
+    with run_stats.phase("http"):
+        result = httpclient.run_load(args.method, args.url, body, headers,
+                args.repeat, args.concurrency, args.duration)
+    run_stats.count(result.requests)
+    write_line(out, httpclient.format_load_report(result))
+
+def send_request(args, body, headers):
+    import requests
+    req_method = getattr(requests, args.method)
+    with run_stats.phase("http"):
+        return req_method(args.url, data=body, headers=headers, stream=True)
+
+def write_cached(entry, out):
+    write_head(entry.status, entry.headers, out)
+    out.write(entry.body)
+    run_stats.count()
+
+def http_cached(args, body, headers, out):
+    '''make the request through the response cache, a fresh entry is
+    written without a request, a stale one is revalidated'''
+    from . import httpcache
+    cache = httpcache.ResponseCache(args.cache or httpcache.DEFAULT_DIR,
+            args.cache_size * 1024 * 1024)
+    key = httpcache.cache_key(args.method, args.url, body)
+    with run_stats.phase("cache"):
+        entry = cache.get(key)
+
+    if entry is not None:
+        if entry.is_fresh():
+            write_cached(entry, out)
+            return
+        headers = dict(headers, **entry.validators())
+
+    resp = send_request(args, body, headers)
+    try:
+        if resp.status_code == 304 and entry is not None:
+            entry.revalidated(resp.headers.items())
+            with run_stats.phase("cache"):
+                cache.put(key, entry)
+            write_cached(entry, out)
+            return
+
+        response_headers = resp.headers.items()
+        write_head(resp.status_code, response_headers, out)
+        if not httpcache.is_storable(resp.status_code, response_headers):
+            write_body(resp, out)
+            return
+
+        recorder = httpcache.RecordingOutput(out)
+        write_body(resp, recorder)
+        with run_stats.phase("cache"):
+            cache.put(key, httpcache.CacheEntry(resp.status_code,
+                response_headers, recorder.getvalue()))
+    finally:
+        resp.close()
+
+def http_req(args, out):
     '''handler for http requests'''
     handler = HANDLERS.get(args.conversion)
 
     if handler:
-        body = handler(args)
+        from . import httpclient
         content_type = CONTENT_TYPE_FOR_CHAR[args.conversion[-1]]
         headers = {'Content-Type': content_type}
-        req_method = getattr(requests, args.method)
-        resp = req_method(args.url, data=body, headers=headers)
-        return format_response(resp)
+        use_cache = getattr(args, 'cache', None) is not None
+
+        if is_load_test(args) or use_cache or \
+                getattr(args, 'no_chunked', False):
+            body_out = StringIO()
+            handler(args, body_out)
+            body = body_out.getvalue()
+            if isinstance(body, unicode):
+                body = body.encode("utf-8")
+        else:
+            # sent with chunked transfer encoding while it's converted
+            body = httpclient.stream_output(handler, args)
+
+        if is_load_test(args):
+            http_load(args, body, headers, out)
+            return
+        elif use_cache:
+            http_cached(args, body, headers, out)
+            return
+
+        resp = send_request(args, body, headers)
+        try:
+            write_response(resp, out)
+        finally:
+            resp.close()
     else:
         print("handler not found for %s" % args.conversion, file=sys.stderr)
 
-    return ""
+def batch_request(request):
+    '''(method, url, body, headers) for a request description, a map with
+    method and url and optionally headers, body, a value sent as transit,
+    or raw-body, a string sent as is, keys can be keywords or strings'''
+    from . import transit_json
+    fields = dict((str(key), value) for key, value in request.items())
+    headers = dict((str(name), str(value)) for name, value in
+            (fields.get('headers') or {}).items())
+
+    if fields.get('body') is not None:
+        body = transit_json.dumps(fields['body'])
+        headers.setdefault('Content-Type', CONTENT_TYPE_FOR_CHAR['t'])
+    else:
+        body = fields.get('raw-body')
+
+    if isinstance(body, unicode):
+        body = body.encode("utf-8")
+
+    return str(fields.get('method', 'get')), str(fields['url']), body, headers
+
+def read_batch_requests(path, input_format):
+    '''yield the requests in an edn file, where a top level vector holds
+    many, or in a json file with one request per line'''
+    from . import edn
+    # read from the feeder thread, so not through run_stats
+    handle = sys.stdin if path == '-' else open(path)
+    if input_format == 'json':
+        for line in handle:
+            if line.strip():
+                yield batch_request(json.loads(line))
+        return
+
+    for value in edn.load_iter(handle, accept_unknown_tags=True):
+        if isinstance(value, dict):
+            yield batch_request(value)
+        else:
+            for request in getattr(value, 'rep', value):
+                yield batch_request(request)
+
+def decode_batch_body(resp):
+    '''[(field, value)] with the body of a response, decoded like http
+    does but as a whole, several top level values are a vector'''
+    from . import httpclient
+    K = transit.transit_types.Keyword
+    read = RESPONSE_READERS.get(
+            httpclient.media_type(resp.headers.get('Content-Type')))
+    if read is None:
+        return [(K("body"), resp.text)]
+
+    content = resp.content
+    if not httpclient.is_utf8(resp.encoding):
+        content = resp.content.decode(resp.encoding).encode("utf-8")
+
+    try:
+        values = list(read(iter([content])))
+    except ResponseDecodeError as error:
+        return [(K("body"), resp.text), (K("decode-error"), str(error))]
+
+    if len(values) == 1:
+        return [(K("body"), values[0])]
+    return [(K("body"), transit.transit_types.Vector(values))]
+
+def batch_record(result):
+    '''edn map written for a BatchResult'''
+    from collections import OrderedDict
+    K = transit.transit_types.Keyword
+    record = OrderedDict([(K("index"), result.index),
+        (K("method"), result.method), (K("url"), result.url)])
+
+    if result.error is not None:
+        record[K("error")] = error_message(result.error)
+    else:
+        record[K("status")] = result.status
+        record.update(result.value)
+    record[K("latency-ms")] = round(result.latency * 1000, 3)
+    return record
+
+def batch_input_format(path):
+    if path.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'json'
+    return 'edn'
+
+def http_batch(args, out):
+    '''handler for http-batch, replays the requests in args.path and writes
+    an edn record for each as it finishes'''
+    from . import httpclient
+    input_format = getattr(args, 'input_format', None) or \
+            batch_input_format(args.path)
+    requests = read_batch_requests(args.path, input_format)
+    results = httpclient.run_batch(requests,
+            getattr(args, 'concurrency', 1), decode_batch_body)
+
+    for result in run_stats.timed(results, "http"):
+        run_stats.count()
+        dump_edn(batch_record(result), out)
+        out.flush()
+
+class BytesOutput(object):
+    '''file like object collecting what the handlers write as utf-8'''
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        self.parts.append(data)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+class Utf8Output(object):
+    '''file like object writing to out what the handlers write as utf-8,
+    python 2 encodes unicode written to a pipe as ascii'''
+
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        self.out.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.out, name)
+
+FORMAT_CHARS = dict((name, char) for char, name in FORMAT_NAMES.items())
+
+def format_char(fmt):
+    '''"edn", "json", "transit" or their first letter -> the letter'''
+    char = FORMAT_CHARS.get(fmt, fmt)
+    if char not in FORMAT_NAMES:
+        raise ValueError("unknown format %r, use edn, json or transit" %
+                (fmt,))
+    return char
+
+def source_handle(src):
+    '''file like object to read src from, a file like object, str, unicode,
+    bytearray or memoryview'''
+    if hasattr(src, 'read'):
+        return src
+    elif isinstance(src, memoryview):
+        src = src.tobytes()
+    elif isinstance(src, bytearray):
+        src = str(src)
+    elif isinstance(src, unicode):
+        src = src.encode("utf-8")
+    elif not isinstance(src, str):
+        raise TypeError("can't convert %s, pass text, bytes or a file" %
+                type(src).__name__)
+
+    return StringIO(src)
+
+def convert(src, src_fmt, dst_fmt, out=None, verbose=False):
+    '''convert src from src_fmt to dst_fmt, formats are "edn", "json" or
+    "transit"
+
+    src is a file like object, str, unicode, bytearray or memoryview, the
+    output is written to the file like object out, or returned as a utf-8
+    str if out is None, verbose writes the json_verbose transit flavour.
+    This runs the same conversion as the cli, one output document per line,
+    with readers and encoders built once and reused across calls'''
+    action = format_char(src_fmt) + "2" + format_char(dst_fmt)
+    args = argparse.Namespace(action=action, path=source_handle(src),
+            verbose=verbose)
+
+    if out is None:
+        result = BytesOutput()
+        HANDLERS[action](args, result)
+        return result.getvalue()
+
+    HANDLERS[action](args, out)
+
+def convert_text(action, text, verbose=False):
+    '''convert text with the handler for conversion action, returns the
+    output as utf-8'''
+    return convert(text, action[0], action[-1], verbose=verbose)
+
+PIPE_FRAMINGS = ('lines', 'length')
+
+def read_frames(handle, framing):
+    '''yield (conversion, document) for each frame until handle is closed,
+    a frame is "conversion document\\n" in lines framing and
+    "conversion length\\n" followed by length bytes in length framing'''
+    while True:
+        # readline, iterating a file reads ahead and would wait for more
+        # frames than the other side sent
+        header = handle.readline()
+        if not header:
+            return
+
+        header = header.rstrip("\r\n")
+        if framing == 'lines':
+            if header:
+                action, _, document = header.partition(" ")
+                yield action, document
+            continue
+
+        action, _, length = header.partition(" ")
+        try:
+            size = int(length)
+        except ValueError:
+            size = -1
+        if size < 0:
+            # where the document ends is unknown, no frame after it can be
+            # read
+            raise ValueError("bad frame header %r" % header)
+
+        document = handle.read(size)
+        if len(document) < size:
+            raise ValueError("frame of %d bytes ended after %d" %
+                    (size, len(document)))
+        yield action, document
+
+def write_frame(out, status, payload, framing):
+    '''write "status payload\\n" in lines framing, where newlines between
+    values become spaces, or "status length\\n" and the payload'''
+    if framing == 'lines':
+        payload = payload.rstrip("\n").replace("\n", " ")
+        out.write("%s %s\n" % (status, payload))
+    else:
+        out.write("%s %d\n" % (status, len(payload)))
+        out.write(payload)
+    out.flush()
+
+def pipe(args, out):
+    '''handler for pipe, converts framed documents from stdin until it's
+    closed, answering each frame with an ok or error frame'''
+    framing = getattr(args, 'framing', 'lines')
+    verbose = getattr(args, 'verbose', False)
+    conversions = dict(CONVERSIONS)
+    handle = getattr(args, 'input', None) or sys.stdin
+
+    try:
+        for action, document in read_frames(handle, framing):
+            run_stats.count()
+            if action not in conversions:
+                write_frame(out, "error", "unknown conversion %s" % action,
+                        framing)
+                continue
+
+            try:
+                result = convert_text(action, document, verbose)
+            except Exception as error:
+                write_frame(out, "error", error_message(error), framing)
+            else:
+                write_frame(out, "ok", result, framing)
+    except ValueError as error:
+        write_frame(out, "error", str(error), framing)
+
+def serve(args, out):
+    '''handler for serve, runs the conversion daemon until interrupted'''
+    from . import server
+    conversion_server = server.make_server(args.host, args.port, args.socket,
+            args.workers, args.max_request_size, args.access_log)
+    server.serve(conversion_server, sys.stderr)
+
+def check_handle(handle, fmt):
+    '''check the whole input in handle, returns (records, errors)'''
+    from . import check
+    buf = None
+    if fmt == 'edn':
+        from . import edn
+        buf = edn.map_file(handle)
+        if buf is not None:
+            run_stats.count_input(len(buf))
+    if buf is None:
+        buf = handle.read()
+
+    try:
+        return check.check_document(buf, fmt), []
+    except check.CheckError as error:
+        return 1, [(error.offset, str(error))]
+
+def check_syntax(args, out):
+    '''handler for check, writes the byte offset and message of each error
+    and exits with status 1 if there were any'''
+    from . import check
+    fmt = args.format
+    with run_stats.phase("check"):
+        if args.jobs > 1:
+            run_stats.count_input(os.path.getsize(args.path))
+            results = check.check_parallel(args.path, fmt, args.jobs,
+                    split_ranges(args.path, args.jobs * 4))
+        elif args.lines:
+            results = [check.check_lines(open_input(args.path), fmt,
+                limit=args.limit)]
+        else:
+            results = [check_handle(open_input(args.path), fmt)]
+
+        records = 0
+        errors = 0
+        for chunk_records, chunk_errors in results:
+            records += chunk_records
+            errors += len(chunk_errors)
+            for offset, message in chunk_errors:
+                out.write("byte %d: %s\n" % (offset, message))
+
+    run_stats.count(records)
+    print("%d records, %d errors" % (records, errors), file=sys.stderr)
+    if errors:
+        sys.exit(1)
 
 CONTENT_TYPE_FOR_CHAR = {
     'j': 'application/json',
@@ -221,12 +1179,41 @@ HANDLERS = {
     'e2t': edn_to_transit,
     'e2e': edn_to_edn,
     't2e': transit_to_edn,
+    'e2j': edn_to_json,
+    'j2e': json_to_edn,
+    'j2j': json_to_json,
+    't2t': transit_to_transit,
 
-    'http': http_req
+    'http': http_req,
+    'http-batch': http_batch,
+    'serve': serve,
+    'pipe': pipe,
+    'check': check_syntax
 }
 
 def main():
     '''cli entry point'''
+    global run_stats
     args = parse_args()
-    handler = HANDLERS[args.action]
-    print(handler(args))
+    if getattr(args, 'lines', False) and args.action in dict(CONVERSIONS):
+        handler = lines_handler
+    else:
+        handler = HANDLERS[args.action]
+
+    if args.stats:
+        run_stats = Stats()
+
+    out = run_stats.wrap_output(Utf8Output(sys.stdout))
+    try:
+        if getattr(args, 'profile', None):
+            from . import profiling
+            profiling.run(handler, args.profile, args, out)
+            print("profile written to %s and %s" % (args.profile,
+                profiling.collapsed_path(args.profile)), file=sys.stderr)
+        else:
+            handler(args, out)
+    finally:
+        if args.stats:
+            sys.stdout.flush()
+            run_stats.report(sys.stderr, args.stats, args.action)
+            run_stats = NULL_STATS